@@ -0,0 +1,27 @@
+# Benchmark: topk_dot_scores over the whole corpus at once vs. block by block (corpus_chunk_size), including blocks
+# smaller than k. Both must return the same top-k.
+import torch
+from time import perf_counter as timer
+
+from Code.RAG.vector_index import topk_dot_scores
+
+num_embeddings = 200_000
+dim = 768
+num_queries = 64
+
+torch.manual_seed(42)
+embeddings = torch.nn.functional.normalize(torch.randn(num_embeddings, dim), dim = 1)
+queries = torch.nn.functional.normalize(torch.randn(num_queries, dim), dim = 1)
+
+for k, corpus_chunk_size in ((5, 50_000), (50, 8_192), (10, 3), (7, 1)):
+    # The tiny block sizes only run on a slice of the corpus
+    corpus = embeddings if corpus_chunk_size >= 1_000 else embeddings[:200]
+    start_time = timer()
+    scores, indices = topk_dot_scores(queries, corpus, k = k)
+    full_time = timer() - start_time
+    start_time = timer()
+    chunked_scores, chunked_indices = topk_dot_scores(queries, corpus, k = k, corpus_chunk_size = corpus_chunk_size)
+    chunked_time = timer() - start_time
+    same = chunked_scores.shape == scores.shape and torch.allclose(chunked_scores, scores, atol = 1e-5)
+    print(f"[INFO] k = {k}, corpus_chunk_size = {corpus_chunk_size}, {len(corpus)} embeddings: "
+          f"one matmul {1000 * full_time:.1f} ms, chunked {1000 * chunked_time:.1f} ms, same top-k scores: {same}")
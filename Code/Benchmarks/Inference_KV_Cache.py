@@ -0,0 +1,47 @@
+# Benchmark: generation tokens/sec with the training-style setup used in LLM_RAG.py
+# (use_cache = False + prepare_model_for_kbit_training + fresh LoRA) vs. load_model_for_inference / prepare_model_for_inference
+import copy
+import torch
+from time import perf_counter as timer
+from peft import LoraConfig, prepare_model_for_kbit_training, get_peft_model
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from Code.RAG.inference import prepare_model_for_inference
+
+# Small randomly initialised GPT-2 so the benchmark runs on CPU without downloading weights
+config = GPT2Config(n_layer = 6, n_head = 8, n_embd = 512, n_positions = 1024, vocab_size = 32000, bos_token_id = 1, eos_token_id = 2)
+batch_size = 4
+prompt_length = 128
+max_new_tokens = 128
+num_runs = 3
+
+def training_setup(model):
+    # What LLM_RAG.py used to do before serving predict_RAG
+    model.config.use_cache = False
+    model = prepare_model_for_kbit_training(model)
+    peft_config = LoraConfig(lora_alpha = 32, lora_dropout = 0.05, r = 16, bias = "none", task_type = "CAUSAL_LM", target_modules = ["c_attn", "c_proj", "c_fc"])
+    return get_peft_model(model, peft_config)
+
+def tokens_per_second(model, input_ids, use_cache: bool) -> float:
+    attention_mask = torch.ones_like(input_ids)
+    # Warm-up
+    model.generate(input_ids = input_ids, attention_mask = attention_mask, max_new_tokens = 4, min_new_tokens = 4, do_sample = False, use_cache = use_cache, pad_token_id = 0)
+    start_time = timer()
+    for _ in range(num_runs):
+        with torch.inference_mode():
+            model.generate(input_ids = input_ids, attention_mask = attention_mask, max_new_tokens = max_new_tokens, min_new_tokens = max_new_tokens,
+                           do_sample = False, use_cache = use_cache, pad_token_id = 0)
+    return num_runs * batch_size * max_new_tokens / (timer() - start_time)
+
+if __name__ == "__main__":
+    torch.manual_seed(0)
+    base_model = GPT2LMHeadModel(config)
+    input_ids = torch.randint(1, config.vocab_size, (batch_size, prompt_length))
+
+    before = training_setup(copy.deepcopy(base_model))
+    before_tps = tokens_per_second(before, input_ids, use_cache = before.config.use_cache)
+    print(f"Training-style setup (no KV cache, unmerged LoRA): {before_tps:8.1f} tokens/sec")
+
+    after = prepare_model_for_inference(training_setup(copy.deepcopy(base_model)))
+    after_tps = tokens_per_second(after, input_ids, use_cache = after.config.use_cache)
+    print(f"Inference setup (KV cache, merged LoRA, eval)     : {after_tps:8.1f} tokens/sec ({after_tps / before_tps:.1f}x)")
@@ -0,0 +1,87 @@
+# Micro-benchmark: original isolate_answer (LLM_RAG.py) vs. the linear text parser and the token-id parser in Code/RAG/answer_parsing.py
+import random
+from time import perf_counter as timer
+from tokenizers import Tokenizer, models, pre_tokenizers, decoders
+from transformers import PreTrainedTokenizerFast
+
+from Code.RAG.answer_parsing import isolate_answer, extract_answers, LLAMA3_TEMPLATE_TOKENS
+
+num_outputs = 2000
+lines_per_answer = 200
+
+def isolate_answer_original(input_string):
+    lines = input_string.split("\n")
+    current_role = None
+    response = ""
+    for line in lines:
+        if line == "assistant":
+            current_role = "assistant"
+            response += line + '\n'
+        elif current_role == 'assistant':
+            response += line + '\n'
+            if 'User:' in line or len(lines) == lines.index(line) + 1:
+                lines1 = response.split('\n')
+                lines1[0] = ''
+                finalresponse = ''
+                for r in lines1:
+                    finalresponse += r + '\n'
+                return finalresponse
+
+words = ["protein", "fiber", "vitamin", "the", "of", "and", "intake", "cells", "energy", "is", "a", "diet"]
+
+def make_tokenizer() -> PreTrainedTokenizerFast:
+    # Word-level tokenizer with the Llama 3 chat-template special tokens, so the benchmark needs no model download
+    vocab = {token : i for i, token in enumerate(["[UNK]", *LLAMA3_TEMPLATE_TOKENS, "user", "assistant", "What", "healthy", "?", ".", *words, *(f"{i}." for i in range(lines_per_answer))])}
+    tokenizer = Tokenizer(models.WordLevel(vocab = vocab, unk_token = "[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer.decoder = decoders.WordPiece()
+    return PreTrainedTokenizerFast(tokenizer_object = tokenizer, unk_token = "[UNK]", additional_special_tokens = list(LLAMA3_TEMPLATE_TOKENS))
+
+def make_outputs(seed: int = 42) -> list[str]:
+    random.seed(seed)
+    outputs = []
+    for _ in range(num_outputs):
+        # Distinct lines so the original implementation returns the right slice and can be compared
+        answer = [f"{i}. " + " ".join(random.choices(words, k = 6)) for i in range(lines_per_answer)]
+        outputs.append("user\nWhat is a healthy diet?\nassistant\n" + "\n".join(answer))
+    return outputs
+
+def run_text():
+    outputs = make_outputs()
+    start_time = timer()
+    expected = [isolate_answer_original(text) for text in outputs]
+    original_time = timer() - start_time
+
+    start_time = timer()
+    result = [isolate_answer(text) for text in outputs]
+    linear_time = timer() - start_time
+    assert result == expected
+
+    print(f"### {num_outputs} decoded outputs x {lines_per_answer} lines")
+    print(f"original isolate_answer: {original_time:.3f} s")
+    print(f"linear isolate_answer  : {linear_time:.3f} s ({original_time / linear_time:.1f}x)")
+
+def run_tokens(tokenizer):
+    # Build Llama 3 style sequences: <|start_header_id|>user<|end_header_id|> ... <|eot_id|><|start_header_id|>assistant<|end_header_id|> ... <|eot_id|>
+    start_header, end_header, end_of_turn = LLAMA3_TEMPLATE_TOKENS
+    texts = [f"{start_header} user {end_header} What is a healthy diet ? {end_of_turn} {start_header} assistant {end_header} " + text.split("assistant\n", 1)[1] + f" {end_of_turn}"
+             for text in make_outputs()]
+    sequences = tokenizer(texts, add_special_tokens = False)["input_ids"]
+
+    # Decoding is needed by any parser; time it alone to see the segmentation overhead on top of it
+    start_time = timer()
+    tokenizer.batch_decode(sequences, skip_special_tokens = True)
+    decode_time = timer() - start_time
+
+    start_time = timer()
+    token_answers = extract_answers(sequences, tokenizer)
+    token_time = timer() - start_time
+    assert all(answer is not None and answer.startswith("0.") for answer in token_answers)
+
+    print(f"### {num_outputs} token-id sequences ({sum(map(len, sequences)) // num_outputs} tokens each)")
+    print(f"batch_decode only      : {decode_time:.3f} s")
+    print(f"extract_answers (ids)  : {token_time:.3f} s (segmentation overhead {token_time - decode_time:+.3f} s)")
+
+if __name__ == "__main__":
+    run_text()
+    run_tokens(make_tokenizer())
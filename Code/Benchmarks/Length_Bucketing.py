@@ -0,0 +1,64 @@
+# Micro-benchmark: test-set generation in fixed slices of 16 prompts in dataset order (the original QA loop) vs. the
+# token-budget batches of similar-length prompts from run_in_length_buckets in Code/utils.py. Reports the fraction of
+# prompt tokens that are padding and the wall time, on a small randomly initialised Llama with MedQA-like prompt lengths
+import random
+import torch
+from time import perf_counter as timer
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM, GenerationConfig
+
+from Code.utils import token_budget_batches, run_in_length_buckets
+
+num_questions = 256
+batch_size = 16
+max_new_tokens = 8
+words = ["heart", "acute", "renal", "drug", "dose", "cell", "nerve", "which", "of", "the", "following", "is"]
+
+vocab = ['<pad>', '<s>', '</s>', '<unk>', 'Question:', 'Options:', 'Answer:'] + [f'{i}.' for i in range(1, 6)] + words
+word_tokenizer = Tokenizer(models.WordLevel({word : i for i, word in enumerate(vocab)}, unk_token = '<unk>'))
+word_tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+tokenizer = PreTrainedTokenizerFast(tokenizer_object = word_tokenizer, pad_token = '<pad>', bos_token = '<s>', eos_token = '</s>', unk_token = '<unk>')
+tokenizer.padding_side = 'left'
+
+torch.manual_seed(0)
+model = LlamaForCausalLM(LlamaConfig(vocab_size = len(vocab), hidden_size = 256, intermediate_size = 512, num_hidden_layers = 4,
+                                     num_attention_heads = 4, num_key_value_heads = 4, pad_token_id = 0)).eval()
+generation_config = GenerationConfig(do_sample = False, max_new_tokens = max_new_tokens, min_new_tokens = max_new_tokens, pad_token_id = 0)
+
+# Short one-line questions mixed with long clinical vignettes (MedQA prompts range from ~30 to ~600 tokens)
+random.seed(42)
+sentence = lambda n: " ".join(random.choices(words, k = n))
+prompts = [f"Question: {sentence(int(random.lognormvariate(4.5, 0.7)) % 600 + 10)} Options: " +
+           " ".join(f"{i}. {sentence(3)}" for i in range(1, 6)) + " Answer:" for _ in range(num_questions)]
+lengths = [len(ids) for ids in tokenizer(prompts)['input_ids']]
+
+def padding_fraction(batches):
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    return 1 - sum(lengths) / padded
+
+def solve_question(question_prompts):
+    inputs = tokenizer(question_prompts, return_tensors = "pt", padding = True)
+    outputs = model.generate(**inputs, generation_config = generation_config)
+    return tokenizer.batch_decode(outputs[:, inputs['input_ids'].shape[1]:], skip_special_tokens = True)
+
+# Same budget as 16 prompts of the mean length, so both runs hold about the same number of tokens per batch
+max_tokens = batch_size * (sum(lengths) // len(lengths) + max_new_tokens)
+fixed_batches = [list(range(i, min(i + batch_size, len(prompts)))) for i in range(0, len(prompts), batch_size)]
+bucketed_batches = token_budget_batches(lengths, max_tokens, extra_tokens = max_new_tokens)
+
+with torch.no_grad():
+    start_time = timer()
+    fixed_answers = []
+    for i in range(0, len(prompts), batch_size):
+        fixed_answers.extend(solve_question(prompts[i : i + batch_size]))
+    fixed_time = timer() - start_time
+
+    start_time = timer()
+    bucketed_answers = run_in_length_buckets(solve_question, prompts, tokenizer, max_tokens = max_tokens, extra_tokens = max_new_tokens)
+    bucketed_time = timer() - start_time
+
+print(f"[INFO] {num_questions} prompts of {min(lengths)}-{max(lengths)} tokens, {max_new_tokens} new tokens each")
+print(f"[INFO] fixed slices of {batch_size}:   {len(fixed_batches)} batches, {100 * padding_fraction(fixed_batches):.1f}% padding, {fixed_time:.2f} seconds")
+print(f"[INFO] token budget {max_tokens}: {len(bucketed_batches)} batches, {100 * padding_fraction(bucketed_batches):.1f}% padding, "
+      f"{bucketed_time:.2f} seconds ({fixed_time / bucketed_time:.1f}x)")
+print(f"[INFO] same answers in the original order: {fixed_answers == bucketed_answers}")
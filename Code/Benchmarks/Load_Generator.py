@@ -0,0 +1,49 @@
+# Load generator for the micro-batching predict_RAG server (Code/RAG/serving.py, started from Code/RAG/LLM_RAG.py)
+# Sends questions as a Poisson process at request_rate requests/sec and reports p50/p99 latency and throughput
+import os
+import json
+import random
+import asyncio
+import numpy as np
+import pandas as pd
+from time import perf_counter as timer
+
+host = "127.0.0.1"
+port = 8000
+num_requests = 200
+request_rate = 4.0 # requests per second
+questions_path = "Dataset/MedQuAD[clean].csv"
+
+async def send_question(question: str) -> float:
+    start_time = timer()
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps({"question" : question}).encode("utf-8")
+    writer.write(f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    if not response.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(response.decode("utf-8", errors = "replace"))
+    return timer() - start_time
+
+async def main(questions: list[str]):
+    tasks = []
+    start_time = timer()
+    for question in questions:
+        tasks.append(asyncio.create_task(send_question(question)))
+        await asyncio.sleep(random.expovariate(request_rate))
+    latencies = np.array(await asyncio.gather(*tasks)) * 1000
+    total_time = timer() - start_time
+
+    print(f"Requests   : {len(latencies)} at ~{request_rate} req/s")
+    print(f"Latency p50: {np.percentile(latencies, 50):.1f} ms")
+    print(f"Latency p99: {np.percentile(latencies, 99):.1f} ms")
+    print(f"Throughput : {len(latencies) / total_time:.2f} req/s")
+
+if __name__ == "__main__":
+    random.seed(42)
+    if os.path.exists(questions_path):
+        questions = pd.read_csv(questions_path).iloc[:, 0].astype(str).tolist()
+    else:
+        questions = ["What is (are) Trigeminal Neuralgia?", "What is (are) keratoderma with woolly hair?", "What are the symptoms of AAA?"]
+    asyncio.run(main(random.choices(questions, k = num_requests)))
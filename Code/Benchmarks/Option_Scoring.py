@@ -0,0 +1,53 @@
+# Micro-benchmark: sampled free-text answers (model.generate, max_new_tokens = 25, the original MedQA evaluation) vs.
+# score_option_labels in Code/Option_Scoring.py (one forward pass per batch), per question, on a small randomly
+# initialised Llama with a word-level tokenizer (no checkpoint download needed; the step count is what is compared).
+# generate runs on left-padded batches (decoder-only models continue from the last position, so right padding would
+# append the new tokens after the pads) and min_new_tokens = max_new_tokens forces all 25 decode steps, as a real
+# checkpoint that writes a sentence would; score_option_labels right-pads internally and restores the padding side.
+import random
+import torch
+from time import perf_counter as timer
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM, GenerationConfig
+
+from Code.Option_Scoring import score_option_labels
+
+num_questions = 64
+batch_size = 16
+words = ["heart", "acute", "renal", "drug", "dose", "cell", "nerve", "which", "of", "the", "following", "is"]
+
+vocab = ['<pad>', '<s>', '</s>', '<unk>', 'Question:', 'Options:', 'Answer:', '[INST]', '[/INST]'] + [f'{i}.' for i in range(1, 6)] + [str(i) for i in range(1, 6)] + words
+word_tokenizer = Tokenizer(models.WordLevel({word : i for i, word in enumerate(vocab)}, unk_token = '<unk>'))
+word_tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+tokenizer = PreTrainedTokenizerFast(tokenizer_object = word_tokenizer, pad_token = '<pad>', bos_token = '<s>', eos_token = '</s>', unk_token = '<unk>')
+tokenizer.padding_side = 'left'
+
+torch.manual_seed(0)
+model = LlamaForCausalLM(LlamaConfig(vocab_size = len(vocab), hidden_size = 256, intermediate_size = 512, num_hidden_layers = 4,
+                                     num_attention_heads = 4, num_key_value_heads = 4, pad_token_id = 0)).eval()
+
+random.seed(42)
+sentence = lambda n: " ".join(random.choices(words, k = n))
+prompts = [f"Question: {sentence(random.randint(40, 200))} Options: " + " ".join(f"{i}. {sentence(3)}" for i in range(1, 6)) +
+           " [INST] Solve this medical question-answering and provide the correct option. [/INST] Answer:" for _ in range(num_questions)]
+
+generation_config = GenerationConfig(do_sample = True, top_k = 1, top_p = 0.9, temperature = 0.1, max_new_tokens = 25,
+                                     min_new_tokens = 25, pad_token_id = tokenizer.pad_token_id)
+
+with torch.no_grad():
+    start_time = timer()
+    decode_steps = []
+    for i in range(0, len(prompts), batch_size):
+        inputs = tokenizer(prompts[i : i + batch_size], return_tensors = "pt", padding = True, truncation = True)
+        outputs = model.generate(**inputs, generation_config = generation_config)
+        decode_steps.append(outputs.shape[1] - inputs["input_ids"].shape[1])
+    generate_time = (timer() - start_time) / num_questions
+
+    start_time = timer()
+    scores = score_option_labels(model, tokenizer, prompts, batch_size = batch_size)
+    score_time = (timer() - start_time) / num_questions
+    assert tokenizer.padding_side == 'left'
+
+print(f"[INFO] {num_questions} questions, batches of {batch_size}")
+print(f"[INFO] generate (left-padded, {min(decode_steps)}-{max(decode_steps)} new tokens per batch): {1000 * generate_time:.2f} ms per question")
+print(f"[INFO] score_option_labels: {1000 * score_time:.2f} ms per question ({generate_time / score_time:.0f}x)")
@@ -0,0 +1,49 @@
+# Micro-benchmark: row-wise generate_prompt via df.apply(axis = 1) (the original path) vs. the column-wise
+# render_prompts in Code/utils.py, on a synthetic MedMCQA-sized table (~183k rows)
+import random
+import pandas as pd
+from time import perf_counter as timer
+
+from Code.utils import convert_format_table, render_prompts
+
+num_rows = 182822
+words = ["heart", "acute", "renal", "drug", "dose", "cell", "nerve", "which", "of", "the", "following", "is"]
+
+def generate_prompt_original(x):
+    cop = 'Nothing'
+    if x['cop'] == 1:
+        cop = x['opa']
+    elif x['cop'] == 2:
+        cop = x['opb']
+    elif x['cop'] == 3:
+        cop = x['opc']
+    elif x['cop'] == 4:
+        cop = x['opd']
+    question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n'.format(x['question'], x['opa'], x['opb'], x['opc'], x['opd'])
+    answer = cop
+    prompt = f"""
+        Question:
+        {question}
+        [INST] Solve this post graduate medical entrance exam MCQ and provide the correct option. [/INST]
+        Answer: {answer} </s>"""
+    return prompt
+
+random.seed(42)
+sentence = lambda n: " ".join(random.choices(words, k = n))
+df = pd.DataFrame({"question" : [sentence(20) for _ in range(num_rows)],
+                   "cop" : [random.randint(1, 4) for _ in range(num_rows)],
+                   **{option : [sentence(3) for _ in range(num_rows)] for option in ["opa", "opb", "opc", "opd"]}})
+table = convert_format_table(df, data_name = 'medmcqa')
+
+start_time = timer()
+original = df.apply(generate_prompt_original, axis = 1)
+original_time = timer() - start_time
+
+start_time = timer()
+rendered = render_prompts(table, data_name = 'medmcqa')
+rendered_time = timer() - start_time
+
+assert original.tolist() == rendered.to_pylist()
+print(f"[INFO] {num_rows} MedMCQA prompts")
+print(f"[INFO] df.apply(generate_prompt): {original_time:.3f} seconds")
+print(f"[INFO] render_prompts:            {rendered_time:.3f} seconds ({original_time / rendered_time:.0f}x)")
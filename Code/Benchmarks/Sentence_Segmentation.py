@@ -0,0 +1,48 @@
+# Benchmark: per-page nlp() loop (original Local_RAG.py) vs. streaming nlp.pipe segmentation
+import os
+import random
+from time import perf_counter as timer
+
+from Code.RAG.ingestion import iter_pdf_pages, iter_page_sentences, sentencizer_pipeline
+
+pdf_path = "human-nutrition-text.pdf"
+num_synthetic_pages = 10_000
+
+def make_synthetic_pages(num_pages: int, sentences_per_page: int = 40, seed: int = 42) -> list[dict]:
+    random.seed(seed)
+    words = ["protein", "fiber", "vitamin", "the", "of", "and", "intake", "cells", "energy", "is", "a", "diet", "mineral", "blood"]
+    pages = []
+    for page_number in range(num_pages):
+        sentences = [" ".join(random.choices(words, k = random.randint(8, 25))).capitalize() + "." for _ in range(sentences_per_page)]
+        pages.append({"page_number" : page_number, "text" : " ".join(sentences)})
+    return pages
+
+def loop_segmentation(pages: list[dict], nlp) -> list[dict]:
+    # Original Local_RAG.py loop
+    for item in pages:
+        item["sentences"] = [str(sentence) for sentence in nlp(item["text"]).sents]
+        item["page_sentence_count_spacy"] = len(item["sentences"])
+    return pages
+
+def run(name: str, pages: list[dict]):
+    nlp = sentencizer_pipeline()
+    print(f"### {name}: {len(pages)} pages")
+
+    start_time = timer()
+    expected = loop_segmentation([dict(page) for page in pages], nlp)
+    loop_time = timer() - start_time
+    print(f"nlp() loop                              : {loop_time:.2f} s")
+
+    for batch_size, n_process in [(64, 1), (256, 1), (256, 2), (256, 4)]:
+        start_time = timer()
+        result = list(iter_page_sentences((dict(page) for page in pages), nlp = nlp, batch_size = batch_size, n_process = n_process))
+        pipe_time = timer() - start_time
+        assert [page["sentences"] for page in result] == [page["sentences"] for page in expected]
+        print(f"nlp.pipe(batch_size = {batch_size:>3}, n_process = {n_process}): {pipe_time:.2f} s ({loop_time / pipe_time:.1f}x)")
+
+if __name__ == "__main__":
+    if os.path.exists(pdf_path):
+        run(pdf_path, list(iter_pdf_pages(pdf_path, page_offset = 41)))
+    else:
+        print(f"[INFO] {pdf_path} not found (run Code/RAG/Local_RAG.py to download it), skipping.")
+    run("Synthetic corpus", make_synthetic_pages(num_synthetic_pages))
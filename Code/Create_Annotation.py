@@ -6,68 +6,71 @@ Created on Mon Dec 18 12:41:01 2023
 """
 
 import re
-import pandas as pd
 import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.util import filter_spans
+
+from Code.NCBI_Corpus import write_iob
+from Code.Preprocessing import main as Preprocessor
 
 file = 'F:/BioNER-Abbrev/Dataset/Scraped/nhsinform/List_of_Disease_Dictionary.json'
-def main(file):
-    if file.endswith((".csv")):
-        df = pd.read_csv(file, encoding = 'utf-8')
-    elif file.endswith(('.json')):
-        df = pd.read_json(file, lines = True)
-    elif file.endswith(('.xlsx', '.xls')):
-        df = pd.read_excel(file)
-    else:
-        print("Error - Wrong file read. Either CSV/JSON/XLSX files are accepted!")
-        
-    df.columns = ['Keyword', 'Definition']
-    
-    # Load the spaCy model
-    nlp = spacy.load("en_core_web_sm")
-    
-    # Initialize an empty list to store tagged words
-    tagged_words = []
-    for f, g in zip(df['Keyword'], df['Definition']):
-        print(f"Keyword: {f}")
-        keyword = f
-        sentence = g
-        
-        # Tokenize the keyword
-        keyword_tokens = keyword.split()
-        
-        # Process the sentence using spaCy
-        doc = nlp(sentence)
-        
-        # Flag to determine if we are inside the keyword
-        inside_keyword = False
-        
-        # Iterate through each word in the processed sentence
-        for token in doc:
-            # Check if the current token is part of the keyword
-            if token.text.lower() == keyword_tokens[0].lower():
-                # Mark the beginning of the keyword
-                inside_keyword = True
-                tag = 'B-Disease'
-                # If the keyword has only one token, mark it and reset the flag
-                if len(keyword_tokens) == 1:
-                    inside_keyword = False
-    
-            elif inside_keyword or token.text.lower() == keyword_tokens[-1].lower():
-                # If inside the keyword and it's the last word, mark as 'I-Disease'
-                tag = 'I-Disease'
-                inside_keyword = False
-            elif inside_keyword:
-                # If inside the keyword and not the last word, mark subsequent words with 'I-Disease'
-                tag = 'I-Disease'
-            else:
-                # If outside the keyword, use 'O' tag
-                tag = 'O'
-    
-            # Append the word and its tag to the list
-            tagged_words.append((token.text, tag))
 
-    return tagged_words
+# Entity label used in the tags (B-Disease, I-Disease, ...)
+ENTITY_LABEL = 'Disease'
+
+# Only the tokenizer is needed to tag keyword spans
+PIPELINE_COMPONENTS = ["tok2vec", "tagger", "morphologizer", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+
+def tokenizer_pipeline(model = "en_core_web_sm"):
+    # Tokenizer-only pipeline: every trained component is excluded (falls back to the same English tokenizer rules
+    # of a blank pipeline when the model package is not installed). The rule-based sentencizer marks sentence boundaries.
+    try:
+        nlp = spacy.load(model, exclude = PIPELINE_COMPONENTS)
+    except OSError:
+        nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+def keyword_matcher(nlp, keywords):
+    # One PhraseMatcher over all keywords, matched case-insensitively
+    matcher = PhraseMatcher(nlp.vocab, attr = "LOWER")
+    matcher.add(ENTITY_LABEL, list(nlp.tokenizer.pipe(str(keyword) for keyword in keywords)))
+    return matcher
+
+def span_tags(doc, spans, scheme = "IOB"):
+    # Token tags for non-overlapping spans: IOB (B-, I-, O) or IOBES (also S- for single tokens and E- for the last token)
+    tags = ['O'] * len(doc)
+    for span in spans:
+        if scheme == "IOBES" and len(span) == 1:
+            tags[span.start] = f'S-{ENTITY_LABEL}'
+            continue
+        tags[span.start] = f'B-{ENTITY_LABEL}'
+        for i in range(span.start + 1, span.end):
+            tags[i] = f'I-{ENTITY_LABEL}'
+        if scheme == "IOBES":
+            tags[span.end - 1] = f'E-{ENTITY_LABEL}'
+    return tags
+
+def iter_tagged_sentences(definitions, keywords, nlp = None, scheme = "IOB", batch_size = 256, n_process = 1):
+    # Yields (tokens, tags) per sentence; every keyword occurrence is tagged, overlapping matches keep the longest
+    nlp = nlp or tokenizer_pipeline()
+    matcher = keyword_matcher(nlp, keywords)
+    strings = nlp.vocab.strings
+    for doc in nlp.pipe((str(definition) for definition in definitions), batch_size = batch_size, n_process = n_process):
+        spans = filter_spans([doc[start : end] for _, start, end in matcher(doc)])
+        tags = span_tags(doc, spans, scheme)
+        # Token texts from the ORTH array (avoids creating a Token object per token)
+        tokens = [strings[orth] for orth in doc.to_array("ORTH").tolist()]
+        for sentence in doc.sents:
+            yield tokens[sentence.start : sentence.end], tags[sentence.start : sentence.end]
+
+def main(file, output_file, scheme = "IOB", batch_size = 256, n_process = 1, chunksize = 10000):
+    # First pass collects the keywords for the matcher, the second streams the definitions through the tagger to the TSV
+    # (same chunked reader as Preprocessing.py, without lowercasing; same writer as NCBI_Corpus.py)
+    reader = Preprocessor(file)
+    keywords = [keyword for df in reader.iter_chunks(chunksize, lowercase = False) for keyword in df['Keyword'].dropna()]
+    definitions = (definition for df in reader.iter_chunks(chunksize, lowercase = False) for definition in df['Definition'].dropna())
+    return write_iob(iter_tagged_sentences(definitions, keywords, scheme = scheme, batch_size = batch_size, n_process = n_process), output_file)
 
-temp = main(file)
-df = pd.DataFrame(temp)
-df.to_csv('F:/BioNER-Abbrev/Dataset/Scraped/nhsinform/nhsinform-IOB.txt', sep = '\t', index = False)
+if __name__ == "__main__":
+    main(file, 'F:/BioNER-Abbrev/Dataset/Scraped/nhsinform/nhsinform-IOB.txt')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Parser for the inline-tagged NCBI disease corpus (Dataset/NCBI/NCBI-Corpus/NCBI_corpus.txt):
+one "PMID<TAB>title<TAB>abstract" line per document with <category="SpecificDisease">...</category> markup.
+
+Each document becomes clean text (title and abstract separated by a newline) and its mentions go into one
+span table, a numpy struct array of (doc, start, end, category) character offsets into the clean text.
+"""
+
+import re
+import numpy as np
+from array import array
+
+CORPUS_FILE = 'Dataset/NCBI/NCBI-Corpus/NCBI_corpus.txt'
+
+# Mention categories of the NCBI disease corpus (uint8 ids in the span table)
+CATEGORIES = ['Modifier', 'SpecificDisease', 'DiseaseClass', 'CompositeMention']
+
+SPAN_DTYPE = np.dtype([('doc', np.int32), ('start', np.int32), ('end', np.int32), ('category', np.uint8)])
+
+TAG_PATTERN = re.compile(r'<category="([^"]+)">(.*?)</category>')
+# Same tokenization as the NCBI-disease-IOB files: words and single punctuation marks ("tumour-suppressor" -> tumour, -, suppressor)
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+SENTENCE_END = {'.', '?', '!'}
+
+def parse_document(line, category_ids):
+    # (pmid, clean text, [(start, end, category id), ...]) of one corpus line, or None for blank lines
+    fields = line.rstrip('\r\n').split('\t')
+    if len(fields) < 2:
+        return None
+    # A few abstracts contain tabs themselves
+    raw = fields[1].strip() + '\n' + ' '.join(fields[2:]).strip()
+
+    pieces, spans, length, position = [], [], 0, 0
+    for match in TAG_PATTERN.finditer(raw):
+        pieces.append(raw[position : match.start()])
+        length += match.start() - position
+        mention = match.group(2)
+        pieces.append(mention)
+        category = category_ids.setdefault(match.group(1), len(category_ids))
+        spans.append((length, length + len(mention), category))
+        length += len(mention)
+        position = match.end()
+    pieces.append(raw[position:])
+    return fields[0], ''.join(pieces), spans
+
+def iter_documents(path = CORPUS_FILE, categories = None):
+    # Streams (pmid, clean text, spans) line by line. Unknown categories are appended to the caller's categories list as
+    # they appear, so it names every category id of the documents yielded so far (None works on a copy of CATEGORIES)
+    categories = list(CATEGORIES) if categories is None else categories
+    category_ids = {category : i for i, category in enumerate(categories)}
+    with open(path, encoding = 'utf-8') as f:
+        for line in f:
+            document = parse_document(line, category_ids)
+            if document is not None:
+                # Ids are assigned in insertion order, so the new names are the dict's last keys
+                categories.extend(list(category_ids)[len(categories):])
+                yield document
+
+def iob_sentences(text, spans, categories = CATEGORIES, label = 'Disease'):
+    # (tokens, tags) per sentence of one document, tagged from its sorted (start, end, category) spans. label = None uses
+    # the category names instead (B-SpecificDisease, ...); the NCBI-disease-IOB files use one 'Disease' label for every category.
+    k = 0
+    tokens, tags = [], []
+    for match in TOKEN_PATTERN.finditer(text):
+        start, end = match.span()
+        # Spans are sorted and non-overlapping, so one pointer walks them with the tokens
+        while k < len(spans) and spans[k][1] <= start:
+            k += 1
+        if k < len(spans) and spans[k][0] < end:
+            tag_label = label or categories[spans[k][2]]
+            tag = f'B-{tag_label}' if start <= spans[k][0] else f'I-{tag_label}'
+        else:
+            tag = 'O'
+        tokens.append(match.group())
+        tags.append(tag)
+        # Title/abstract boundary or sentence-final punctuation closes the sentence
+        if match.group() in SENTENCE_END or text.startswith('\n', end):
+            yield tokens, tags
+            tokens, tags = [], []
+    if tokens:
+        yield tokens, tags
+
+def write_iob(sentences, output_file):
+    # CoNLL-style TSV like the NCBI-disease-IOB files: "token<TAB>tag" per line, a blank line after each sentence.
+    # Sentences are written as they arrive (memory does not grow with the corpus). Whitespace tokens (e.g. spaCy's "\n")
+    # would break the one-token-per-line format and are dropped; sentences left empty are skipped. Returns the number of
+    # tokens written.
+    num_tokens = 0
+    with open(output_file, 'w', encoding = 'utf-8') as f:
+        for tokens, tags in sentences:
+            lines = [f'{token}\t{tag}\n' for token, tag in zip(tokens, tags) if token and not token.isspace()]
+            if lines:
+                f.write(''.join(lines) + '\n')
+                num_tokens += len(lines)
+    return num_tokens
+
+def stream_iob(path, output_file, label = 'Disease'):
+    # Corpus file -> IOB TSV in one pass without keeping the documents (constant memory for PubMed-sized corpora)
+    categories = list(CATEGORIES)
+    return write_iob((sentence for _, text, spans in iter_documents(path, categories) for sentence in iob_sentences(text, spans, categories, label)), output_file)
+
+class NCBICorpus:
+    # All documents of the corpus: pmids, clean texts and the span table (spans of document i are contiguous)
+    def __init__(self, path = CORPUS_FILE):
+        self.categories = list(CATEGORIES)
+        self.pmids, self.texts = [], []
+        columns = {name : array('i') for name in SPAN_DTYPE.names}
+        for doc, (pmid, text, spans) in enumerate(iter_documents(path, self.categories)):
+            self.pmids.append(pmid)
+            self.texts.append(text)
+            for start, end, category in spans:
+                columns['doc'].append(doc)
+                columns['start'].append(start)
+                columns['end'].append(end)
+                columns['category'].append(category)
+
+        self.spans = np.zeros(len(columns['doc']), dtype = SPAN_DTYPE)
+        for name in SPAN_DTYPE.names:
+            self.spans[name] = np.frombuffer(columns[name], dtype = np.int32)
+        # Span rows of document i: spans[span_offsets[i] : span_offsets[i + 1]]
+        self.span_offsets = np.searchsorted(self.spans['doc'], np.arange(len(self.texts) + 1))
+    # end_def
+
+    def __len__(self):
+        return len(self.texts)
+    # end_def
+
+    def document_spans(self, doc):
+        return self.spans[self.span_offsets[doc] : self.span_offsets[doc + 1]]
+    # end_def
+
+    def mentions(self, doc):
+        # [(mention text, category name), ...] of one document
+        text = self.texts[doc]
+        return [(text[start : end], self.categories[category]) for _, start, end, category in self.document_spans(doc).tolist()]
+    # end_def
+
+    def iter_iob_sentences(self, label = 'Disease'):
+        for doc, text in enumerate(self.texts):
+            spans = [(start, end, category) for _, start, end, category in self.document_spans(doc).tolist()]
+            yield from iob_sentences(text, spans, self.categories, label)
+    # end_def
+
+    def write_iob(self, output_file, label = 'Disease'):
+        return write_iob(self.iter_iob_sentences(label), output_file)
+    # end_def
+
+if __name__ == "__main__":
+    from time import perf_counter as timer
+    start_time = timer()
+    corpus = NCBICorpus(CORPUS_FILE)
+    print(f"[INFO] {len(corpus)} documents, {len(corpus.spans)} mentions parsed in {timer() - start_time:.3f} seconds")
+    start_time = timer()
+    num_tokens = corpus.write_iob('Dataset/NCBI/NCBI-Corpus/NCBI_corpus-IOB.tsv')
+    print(f"[INFO] {num_tokens} tokens written as IOB in {timer() - start_time:.3f} seconds")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Binary cache for the IOB/IOBES NER corpora (Dataset/NCBI/NCBI-disease-IOB, NCBI-disease-IOBES, BC5CDR/BC5CDR-IOB).
+
+Each split's TSV ("token<TAB>tag" lines, blank line between sentences) is parsed once into
+    <split>.tokens.npy   int32 token ids (all sentences concatenated)
+    <split>.tags.npy     uint8 tag ids
+    <split>.offsets.npy  int64 sentence offsets (sentence i is tokens[offsets[i] : offsets[i + 1]])
+plus vocab.txt / tags.txt shared by all splits of the corpus. Later loads memory-map the arrays.
+"""
+
+import os
+import json
+import numpy as np
+
+from Code.utils import file_fingerprint
+
+# Files inside a cache directory
+VOCAB_FILE = 'vocab.txt'
+TAGS_FILE = 'tags.txt'
+INFO_FILE = 'cache_info.json'
+
+# Reserved token ids
+PAD_TOKEN, UNK_TOKEN = '[PAD]', '[UNK]'
+
+def load_classes(path):
+    # One tag per line (e.g. Dataset/NCBI/classes.txt)
+    with open(path, encoding = 'utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def corpus_splits(corpus_dir):
+    # {split name : TSV path}, e.g. {'train': .../train.tsv, 'dev': .../dev.tsv, 'test': .../test.tsv}
+    return {name[: -len('.tsv')] : os.path.join(corpus_dir, name) for name in sorted(os.listdir(corpus_dir)) if name.endswith('.tsv')}
+
+def parse_tsv(path):
+    # Sentences as (tokens, tags) lists; handles both \n and \r\n line endings
+    with open(path, encoding = 'utf-8') as f:
+        blocks = f.read().replace('\r\n', '\n').split('\n\n')
+    for block in blocks:
+        lines = [line.split('\t') for line in block.split('\n') if line.strip()]
+        if lines:
+            yield [line[0] for line in lines], [line[-1] for line in lines]
+
+def build_corpus_cache(corpus_dir, cache_dir, classes_path = None):
+    # Parses every split of the corpus once. Token ids come from the training split's vocabulary (0 = [PAD], 1 = [UNK]);
+    # tag ids follow classes_path, and tags missing from it (e.g. S-/E- in IOBES, Chemical in BC5CDR) are appended.
+    splits = corpus_splits(corpus_dir)
+    tags = load_classes(classes_path) if classes_path else []
+    tag_ids = {tag : i for i, tag in enumerate(tags)}
+    vocab = {PAD_TOKEN : 0, UNK_TOKEN : 1}
+    os.makedirs(cache_dir, exist_ok = True)
+
+    # Training split first so its tokens get ids; tokens only seen in dev/test map to [UNK]
+    for split in sorted(splits, key = lambda split: split != 'train'):
+        token_ids, tag_id_list, lengths = [], [], []
+        for sentence_tokens, sentence_tags in parse_tsv(splits[split]):
+            if split == 'train':
+                token_ids.extend(vocab.setdefault(token, len(vocab)) for token in sentence_tokens)
+            else:
+                token_ids.extend(vocab.get(token, 1) for token in sentence_tokens)
+            tag_id_list.extend(tag_ids.setdefault(tag, len(tag_ids)) for tag in sentence_tags)
+            lengths.append(len(sentence_tokens))
+        if len(tag_ids) > 256:
+            raise ValueError(f"{len(tag_ids)} tags do not fit in uint8")
+        np.save(os.path.join(cache_dir, f'{split}.tokens.npy'), np.array(token_ids, dtype = np.int32))
+        np.save(os.path.join(cache_dir, f'{split}.tags.npy'), np.array(tag_id_list, dtype = np.uint8))
+        np.save(os.path.join(cache_dir, f'{split}.offsets.npy'), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+    with open(os.path.join(cache_dir, VOCAB_FILE), 'w', encoding = 'utf-8') as f:
+        f.write('\n'.join(sorted(vocab, key = vocab.get)))
+    with open(os.path.join(cache_dir, TAGS_FILE), 'w', encoding = 'utf-8') as f:
+        f.write('\n'.join(sorted(tag_ids, key = tag_ids.get)))
+    # Written last: a cache without it (interrupted build) is rebuilt
+    with open(os.path.join(cache_dir, INFO_FILE), 'w') as f:
+        json.dump({'sources' : {split : file_fingerprint(path) for split, path in splits.items()},
+                   'classes' : file_fingerprint(classes_path) if classes_path else None,
+                   'num_tokens' : len(vocab),
+                   'num_tags' : len(tag_ids)}, f)
+    return cache_dir
+
+class NERCorpus:
+    # Memory-mapped splits of a corpus cache, built on first use (or rebuilt when a source TSV changed)
+    def __init__(self, corpus_dir, cache_dir = None, classes_path = None):
+        self.cache_dir = cache_dir or os.path.join(corpus_dir, '.cache')
+        if not self._is_fresh(corpus_dir, classes_path):
+            build_corpus_cache(corpus_dir, self.cache_dir, classes_path)
+        with open(os.path.join(self.cache_dir, VOCAB_FILE), encoding = 'utf-8') as f:
+            self.vocab = f.read().split('\n')
+        with open(os.path.join(self.cache_dir, TAGS_FILE), encoding = 'utf-8') as f:
+            self.tags = f.read().split('\n')
+        self.splits = {}
+    # end_def
+
+    def _is_fresh(self, corpus_dir, classes_path):
+        info_path = os.path.join(self.cache_dir, INFO_FILE)
+        if not os.path.exists(info_path):
+            return False
+        with open(info_path) as f:
+            info = json.load(f)
+        sources = {split : file_fingerprint(path) for split, path in corpus_splits(corpus_dir).items()}
+        return info['sources'] == sources and info['classes'] == (file_fingerprint(classes_path) if classes_path else None)
+    # end_def
+
+    def split(self, name):
+        # (token ids, tag ids, sentence offsets) as read-only memory maps
+        if name not in self.splits:
+            self.splits[name] = tuple(np.load(os.path.join(self.cache_dir, f'{name}.{part}.npy'), mmap_mode = 'r') for part in ('tokens', 'tags', 'offsets'))
+        return self.splits[name]
+    # end_def
+
+    def num_sentences(self, name):
+        return len(self.split(name)[2]) - 1
+    # end_def
+
+    def iter_batches(self, name, batch_size = 32, max_length = None, shuffle = False, seed = 0, pad_tag_id = -100):
+        # Padded (token_ids, tag_ids, attention_mask) int64 arrays of shape (batch, longest sentence in the batch).
+        # Each batch is gathered with one fancy-indexing read; padded tags are pad_tag_id (ignored by CrossEntropyLoss).
+        tokens, tags, offsets = self.split(name)
+        order = np.random.default_rng(seed).permutation(len(offsets) - 1) if shuffle else np.arange(len(offsets) - 1)
+        for batch_start in range(0, len(order), batch_size):
+            sentences = order[batch_start : batch_start + batch_size]
+            starts = offsets[sentences]
+            lengths = offsets[sentences + 1] - starts
+            if max_length is not None:
+                lengths = np.minimum(lengths, max_length)
+            positions = np.arange(lengths.max())
+            mask = positions[None, :] < lengths[:, None]
+            # Padding positions read index 0 and are overwritten below
+            index = np.where(mask, starts[:, None] + positions[None, :], 0)
+            token_ids = np.where(mask, tokens[index].astype(np.int64), 0)
+            tag_ids = np.where(mask, tags[index].astype(np.int64), pad_tag_id)
+            yield token_ids, tag_ids, mask.astype(np.int64)
+    # end_def
+
+if __name__ == "__main__":
+    from time import perf_counter as timer
+    for corpus_dir in ['Dataset/NCBI/NCBI-disease-IOB', 'Dataset/NCBI/NCBI-disease-IOBES', 'Dataset/BC5CDR/BC5CDR-IOB']:
+        start_time = timer()
+        corpus = NERCorpus(corpus_dir, classes_path = 'Dataset/NCBI/classes.txt')
+        num_batches = sum(1 for _ in corpus.iter_batches('train', batch_size = 32, shuffle = True))
+        print(f"[INFO] {corpus_dir}: {corpus.num_sentences('train')} train sentences, {len(corpus.vocab)} tokens, tags {corpus.tags}, "
+              f"{num_batches} batches in {timer() - start_time:.3f} seconds")
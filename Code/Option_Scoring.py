@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Multiple-choice evaluation without sampling: options are ranked by the model's own probabilities.
+
+score_option_labels: next-token log-probabilities of the option labels ("1".."5") right after the prompt's "Answer: ",
+    one forward pass per batch of prompts instead of max_new_tokens decoding steps.
+score_option_likelihoods: log-likelihood of each option's text after one prompt; the prompt (the shared prefix) is
+    encoded once and its key/value cache is reused by all options in one batched forward pass.
+"""
+
+import inspect
+import torch
+import numpy as np
+
+from Code.utils import token_budget_batches
+
+OPTION_LABELS = ['1', '2', '3', '4', '5']
+# Option columns of the converted datasets, in label order
+OPTION_COLUMNS = ['opa', 'opb', 'opc', 'opd', 'ope']
+
+def label_token_ids(tokenizer, labels = OPTION_LABELS):
+    # Candidate token ids of each label: the label may be tokenized on its own or with a leading space
+    # ("1" vs "▁1"/"Ġ1") depending on the tokenizer and the prompt's trailing whitespace
+    candidates = []
+    for label in labels:
+        ids = {tokenizer(text, add_special_tokens = False)['input_ids'][-1] for text in (label, ' ' + label)}
+        candidates.append(sorted(ids))
+    return candidates
+
+def _supports_logits_to_keep(model):
+    # Causal LMs of recent transformers versions accept logits_to_keep; PEFT wrappers forward it to their base model
+    base_model = model.get_base_model() if hasattr(model, 'get_base_model') else model
+    return 'logits_to_keep' in inspect.signature(base_model.forward).parameters
+
+def _last_token_logits(model, inputs, logits_to_keep = False):
+    # Logits of the last real token of each right-padded row. With logits_to_keep (see _supports_logits_to_keep) only
+    # those positions are projected to the vocabulary (a full (batch, length, vocab) tensor is several GB for 128k-token
+    # vocabularies)
+    last = inputs['attention_mask'].sum(dim = 1) - 1
+    rows = torch.arange(len(last), device = last.device)
+    if model.config.is_encoder_decoder:
+        # First decoder step of a seq2seq model (Flan-T5)
+        decoder_input_ids = torch.full((len(last), 1), model.config.decoder_start_token_id, device = last.device)
+        return model(**inputs, decoder_input_ids = decoder_input_ids).logits[:, -1]
+    if not logits_to_keep:
+        return model(**inputs).logits[rows, last]
+    keep, column = torch.unique(last, return_inverse = True)
+    return model(**inputs, logits_to_keep = keep).logits[rows, column]
+
+def _drop_appended_eos(inputs, tokenizer):
+    # Tokenizers with add_eos_token = True (set for fine-tuning) end every prompt with </s>; the answer is read before it
+    mask = inputs['attention_mask']
+    last = mask.sum(dim = 1) - 1
+    appended = inputs['input_ids'].gather(1, last[:, None]).squeeze(1) == tokenizer.eos_token_id
+    mask[appended.nonzero().squeeze(1), last[appended]] = 0
+
+@torch.no_grad()
+def score_option_labels(model, tokenizer, prompts, labels = OPTION_LABELS, batch_size = 16, max_length = None, max_tokens = None):
+    # (prompts, labels) array of label log-probabilities at the answer position; argmax(axis = 1) is the predicted option.
+    # Prompts are batched by similar token length (at most batch_size prompts, and max_tokens padded tokens if given);
+    # rows come back in prompt order.
+    candidates = label_token_ids(tokenizer, labels)
+    logits_to_keep = not model.config.is_encoder_decoder and _supports_logits_to_keep(model)
+    lengths = [len(ids) for ids in tokenizer(list(prompts))['input_ids']]
+    scores = np.zeros((len(prompts), len(labels)), dtype = np.float32)
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = 'right'
+    try:
+        for batch in token_budget_batches(lengths, max_tokens or float('inf'), max_batch_size = batch_size):
+            inputs = tokenizer([prompts[i] for i in batch], return_tensors = "pt", padding = True,
+                               truncation = max_length is not None, max_length = max_length).to(model.device)
+            _drop_appended_eos(inputs, tokenizer)
+            log_probs = torch.log_softmax(_last_token_logits(model, inputs, logits_to_keep).float(), dim = -1)
+            scores[batch] = torch.stack([torch.logsumexp(log_probs[:, ids], dim = -1) for ids in candidates], dim = 1).cpu().numpy()
+    finally:
+        tokenizer.padding_side = padding_side
+    return scores
+
+def _repeat_cache(past_key_values, n):
+    # Key/value cache of one sequence repeated for n continuations (Cache objects or legacy per-layer tuples)
+    if hasattr(past_key_values, 'batch_repeat_interleave'):
+        past_key_values.batch_repeat_interleave(n)
+        return past_key_values
+    return tuple(tuple(tensor.repeat_interleave(n, dim = 0) for tensor in layer) for layer in past_key_values)
+
+@torch.no_grad()
+def score_option_likelihoods(model, tokenizer, prompt, options, length_normalize = True):
+    # Log-likelihood of each option text as the continuation of prompt (decoder-only models). The prompt is encoded once;
+    # all options then run as one batch on top of its cache. length_normalize averages over the option's tokens so that
+    # long options are not penalised for their length.
+    prefix = tokenizer(prompt, return_tensors = "pt")
+    if prefix['input_ids'].shape[1] > 1 and prefix['input_ids'][0, -1] == tokenizer.eos_token_id:
+        prefix = {name : tensor[:, :-1] for name, tensor in prefix.items()}
+    prefix = {name : tensor.to(model.device) for name, tensor in prefix.items()}
+    output = model(**prefix, use_cache = True)
+    first_log_probs = torch.log_softmax(output.logits[0, -1].float(), dim = -1)
+
+    option_ids = [tokenizer(str(option), add_special_tokens = False)['input_ids'] or [tokenizer.eos_token_id] for option in options]
+    width = max(len(ids) for ids in option_ids)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    input_ids = torch.full((len(options), width), pad_token_id, dtype = torch.long)
+    mask = torch.zeros((len(options), width), dtype = torch.long)
+    for i, ids in enumerate(option_ids):
+        input_ids[i, : len(ids)] = torch.tensor(ids)
+        mask[i, : len(ids)] = 1
+    input_ids, mask = input_ids.to(model.device), mask.to(model.device)
+
+    attention_mask = torch.cat([prefix['attention_mask'].expand(len(options), -1), mask], dim = 1)
+    past_key_values = _repeat_cache(output.past_key_values, len(options))
+    log_probs = torch.log_softmax(model(input_ids = input_ids, attention_mask = attention_mask,
+                                        past_key_values = past_key_values).logits.float(), dim = -1)
+    # Token t of an option is predicted by the prompt's last position (t = 0) or by option token t - 1
+    token_log_probs = torch.cat([first_log_probs[input_ids[:, :1]],
+                                 log_probs[:, :-1].gather(-1, input_ids[:, 1:, None]).squeeze(-1)], dim = 1) * mask
+    scores = token_log_probs.sum(dim = 1)
+    if length_normalize:
+        scores = scores / mask.sum(dim = 1)
+    return scores.cpu().numpy()
+
+def predicted_options(scores, option_table, columns = OPTION_COLUMNS):
+    # Text of the best-scoring option of every row (option_table: DataFrame with the option columns, e.g. test_df)
+    options = option_table[columns[: scores.shape[1]]].to_numpy()
+    return options[np.arange(len(options)), scores.argmax(axis = 1)].tolist()
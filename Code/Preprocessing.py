@@ -7,10 +7,88 @@ Created on Sun Dec 17 23:35:25 2023
 
 import re
 import pandas as pd
+from itertools import accumulate
 
 # New annotation string to add
 NEW_PREFIX_STRING = ' [disease]'
 
+# Keywords and definitions are matched on whole words; split() with the capture group returns [gap, word, gap, word, ..., gap]
+WORD_PATTERN = re.compile(r"(\w+)")
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over word tokens: every keyword is compiled once, then each definition is scanned
+    in a single linear pass that finds all keyword occurrences; overlapping matches keep the leftmost-longest one.
+    """
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        # Lengths (in words) of the keywords ending at each state, including those reached through fail links
+        self.output = [()]
+        for keyword in keywords:
+            words = WORD_PATTERN.findall(keyword)
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                if word not in self.goto[state]:
+                    self.goto[state][word] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = self.goto[state][word]
+            self.output[state] = (len(words),)
+
+        # Breadth-first fail links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and word not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(word, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+                queue.append(next_state)
+    # end_def
+
+    def find(self, text):
+        """Non-overlapping (start, end) character spans of the keywords in text, leftmost-longest."""
+        pieces = WORD_PATTERN.split(text)
+        goto, fail, output = self.goto, self.fail, self.output
+        matches = []
+        state = 0
+        for i, word in enumerate(pieces[1::2]):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if output[state]:
+                matches.extend((i - length + 1, i) for length in output[state])
+        if not matches:
+            return []
+
+        # Word i is pieces[2 * i + 1]; ends[j] is the character offset where pieces[j] ends
+        ends = list(accumulate(map(len, pieces)))
+        # Longest match first at each start word, then skip anything overlapping an accepted match
+        matches.sort(key = lambda match: (match[0], match[0] - match[1]))
+        result, next_free = [], 0
+        for first, last in matches:
+            if first >= next_free:
+                result.append((ends[2 * first], ends[2 * last + 1]))
+                next_free = last + 1
+        return result
+    # end_def
+
+    def annotate(self, text, tag = NEW_PREFIX_STRING):
+        """Appends tag after every keyword occurrence in text."""
+        pieces, position = [], 0
+        for _, end in self.find(text):
+            pieces.append(text[position : end])
+            pieces.append(tag)
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
+    # end_def
+
 class main:
     # Set Initiate: Search for the file directory
     def __init__(self, file):
@@ -22,7 +100,7 @@ class main:
     def read_file(self):
         if self.file.endswith((".csv")):
             df = pd.read_csv(self.file, encoding = 'utf-8')
-        elif self.file.endswith(('.json')):
+        elif self.file.endswith(('.json', '.jsonl')):
             df = pd.read_json(self.file, lines = True)
         elif self.file.endswith(('.xlsx', '.xls')):
             df = pd.read_excel(self.file)
@@ -33,18 +111,56 @@ class main:
         df.columns = ['Keyword', 'Definition']
         
         # Text Preprocessing
-        df['Keyword'] = df['Keyword'].apply(lambda x : x.lower())
-        df['Definition'] = df['Definition'].apply(lambda x : x.lower())
+        df['Keyword'] = df['Keyword'].str.lower()
+        df['Definition'] = df['Definition'].str.lower()
         
-        # Iterate over each keywords in the DataFrame Definition column
-        for index, row in df.iterrows():
-            # Apply the `NEW_PREFIX_STRING` corresponding each keyword from the df Keyword column.
-            df.at[index, 'Definition'] = re.sub(re.escape(row['Keyword']), lambda match: match.group() + NEW_PREFIX_STRING, row['Definition'])
+        # Compile every keyword into one automaton and tag all keyword occurrences in every definition
+        # (one linear pass per definition instead of one re.sub per row that only looked for the row's own keyword)
+        automaton = KeywordAutomaton(df['Keyword'])
+        df['Definition'] = [automaton.annotate(definition) for definition in df['Definition']]
             
         return df
     # end_def
 
+    # Read the file in fixed-size chunks (JSON Lines / CSV iterators); XLSX cannot be streamed and is read as one chunk.
+    # lowercase = False keeps the original case (Create_Annotation.py matches case-insensitively and writes the tokens as-is)
+    def iter_chunks(self, chunksize = 10000, lowercase = True):
+        if self.file.endswith((".csv")):
+            chunks = pd.read_csv(self.file, encoding = 'utf-8', chunksize = chunksize)
+        elif self.file.endswith(('.json', '.jsonl')):
+            chunks = pd.read_json(self.file, lines = True, chunksize = chunksize)
+        elif self.file.endswith(('.xlsx', '.xls')):
+            chunks = [pd.read_excel(self.file)]
+        else:
+            raise ValueError("Error - Wrong file read. Either CSV/JSON/XLSX files are accepted!")
+
+        for df in chunks:
+            df.columns = ['Keyword', 'Definition']
+            if lowercase:
+                df['Keyword'] = df['Keyword'].str.lower()
+                df['Definition'] = df['Definition'].str.lower()
+            yield df
+    # end_def
+
+    # Streaming version of read_file: each annotated chunk is appended to the output JSON Lines file, so memory stays
+    # constant in the file size. The first pass only collects the keywords (every definition is tagged with all of them).
+    def stream_to_jsonl(self, output_file, chunksize = 10000):
+        keywords = []
+        for df in self.iter_chunks(chunksize):
+            keywords.extend(df['Keyword'].dropna())
+        automaton = KeywordAutomaton(keywords)
+        del keywords
+
+        num_rows = 0
+        with open(output_file, 'w', encoding = 'utf-8') as f:
+            for df in self.iter_chunks(chunksize):
+                df['Definition'] = [automaton.annotate(definition) if isinstance(definition, str) else definition for definition in df['Definition']]
+                records = df.to_json(orient = 'records', lines = True)
+                f.write(records if records.endswith('\n') else records + '\n')
+                num_rows += len(df)
+        return num_rows
+    # end_def
+
 if __name__ == "__main__":
     temp = main(input("Insert the file directory of the JSON/CSV/XLSX file location: "))
-    df = temp.read_file()
-    df.to_json(input("Insert the save file location directory (DEFAULT: .JSON): ") + '.json', orient = 'records', lines = True)
\ No newline at end of file
+    temp.stream_to_jsonl(input("Insert the save file location directory (DEFAULT: .JSON): ") + '.json')
\ No newline at end of file
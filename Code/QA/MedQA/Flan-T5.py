@@ -2,83 +2,38 @@ import os
 #os.environ["CUDA_VISIBLE_DEVICES"] = "0"
 from typing import Optional
 import nltk
-import pandas as pd
 import re
 import evaluate
 import warnings
 import numpy as np
 import torch
-from datasets import load_dataset, Dataset, DatasetDict
+from datasets import load_dataset
 from peft import LoraConfig, TaskType, prepare_model_for_kbit_training, get_peft_model
 from transformers import (T5ForConditionalGeneration, T5Tokenizer, BitsAndBytesConfig, AutoTokenizer, TrainingArguments, GenerationConfig, Seq2SeqTrainingArguments, DataCollatorForSeq2Seq, Seq2SeqTrainer)
 import tqdm
 from tqdm import tqdm
 import rouge_score
 import tensorrt as trt
+from Code.utils import load_or_build_splits, run_in_length_buckets, render_prompts, generate_prompt, OPTIONS_5
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/mnt/nvme01/huggingface/models/Google/"
 
-# 1. Load the Dataset
-dataset = load_dataset("bigbio/med_qa")
-train_data = dataset['train']
-val_data = dataset['validation']
-test_data = dataset['test']
-
-# 2. Preset the the Instruction-based prompt template
-def generate_prompt(x):
-    answer_idx = 'Nothing'
-    if x['answer_idx'] == 'A':
-        answer_idx = x['opa']
-    elif x['answer_idx'] == 'B':
-        answer_idx = x['opb']
-    elif x['answer_idx'] == 'C':
-        answer_idx = x['opc']
-    elif x['answer_idx'] == 'D':
-        answer_idx = x['opd']
-    elif x['answer_idx'] == 'E':
-        answer_idx = x['ope']
-    question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n5. {}\n'.format(x['question'], 
-                                                                          x['opa'],
-                                                                          x['opb'], 
-                                                                          x['opc'], 
-                                                                          x['opd'], 
-                                                                          x['ope'])
-    answer = answer_idx
-    prompt = f"Question: {question}\nAnswer: {answer}"
-    return prompt
+# 1. Load the Dataset (only on the first run: the converted splits are cached under Dataset/Cache by load_or_build_splits)
+def load_medqa():
+    return load_dataset("bigbio/med_qa")
+
+# 2. Preset the the Instruction-based prompt template (rendered for every row at once by Code.utils.render_prompts)
+PROMPT_TEMPLATE = 'Question: {question}\n' + OPTIONS_5 + '\nAnswer: {answer_text}'
 
 def generate_and_tokenize_prompt(prompt):
-    return tokenizer(generate_prompt(prompt), truncation = True)
-
-def convert_format_df(data):
-    data_extracted = [
-    {'question' : variable['question'], 
-     'answer_idx' : variable['answer_idx'], 
-     'answer' : variable['answer'],
-     'opa' : variable['options'][0]['value'], 
-     'opb' : variable['options'][1]['value'], 
-     'opc' : variable['options'][2]['value'], 
-     'opd' : variable['options'][3]['value'], 
-     'ope' : variable['options'][4]['value']}
-    for variable in data
-    ]
-    df = pd.DataFrame(data_extracted)
-    df['text'] = df.apply(lambda x: generate_prompt(x), axis = 1)
-    data_hf = Dataset.from_pandas(df)
-    return df, data_hf
-
-train_df, train_hf = convert_format_df(train_data)
-val_df, val_hf = convert_format_df(val_data)
-test_df, test_hf = convert_format_df(test_data)
-
-health_dataset_dict = DatasetDict({
-    'train': train_hf,
-    'validation': val_hf,
-    'test': test_hf
-})
+    return tokenizer(generate_prompt(prompt, data_name = 'medqa', template = PROMPT_TEMPLATE), truncation = True)
+
+health_dataset_dict = load_or_build_splits(load_medqa, data_name = 'medqa', splits = ['train', 'validation', 'test'], template = PROMPT_TEMPLATE)
+train_hf, val_hf, test_hf = health_dataset_dict['train'], health_dataset_dict['validation'], health_dataset_dict['test']
+test_df = test_hf.to_pandas()
 
 def print_number_of_trainable_model_parameters(model):
     trainable_model_params = 0
@@ -141,7 +96,9 @@ def preprocess_function(examples):
    model_inputs["labels"] = labels["input_ids"]
    return model_inputs
 
-tokenized_dataset = health_dataset_dict.map(preprocess_function, batched = True)
+# Tokenized splits are cached too (keyed by the tokenizer and the input max_length of preprocess_function)
+tokenized_dataset = load_or_build_splits(load_medqa, data_name = 'medqa', splits = ['train', 'validation', 'test'], template = PROMPT_TEMPLATE,
+                                         tokenizer = tokenizer, max_length = 128, tokenize_fn = preprocess_function)
 
 metric = evaluate.load("rouge")
 
@@ -200,11 +157,8 @@ trainer.train()
 # 6. Test and compare the non-fine-tuned model against the fine-tuned MistralAI's model
 import tqdm
 
-def generate_test_prompt(x):
-    question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n5. {}\n'.format(x['question'], x['opa'], x['opb'], x['opc'], x['opd'], x['ope'])
-    prompt = f"Question:{question}\nAnswer: "
-    return prompt
-test_df['text'] = test_df.apply(lambda x: generate_test_prompt(x), axis = 1)
+TEST_PROMPT_TEMPLATE = 'Question:{question}\n' + OPTIONS_5 + '\nAnswer: '
+test_df['text'] = render_prompts(test_df, data_name = 'medqa', template = TEST_PROMPT_TEMPLATE).to_pylist()
 
 # Load the best checkpoint of Mistral-7B-Instruct
 model_id = 'Results/MedQA/Flan-T5/checkpoint-1274'
@@ -233,12 +187,9 @@ def solve_question(question_prompt):
     return answer
 
 import tqdm
-all_answers = []
 test_prompts = list(test_df['text'])
-for i in tqdm.tqdm(range(0, len(test_prompts), 16)):
-    question_prompts = test_prompts[i:i+16]
-    ans = solve_question(question_prompts)
-    all_answers.extend(ans)
+# Batches of similar-length prompts under a token budget (Code.utils.run_in_length_buckets); answers come back in test_df order
+all_answers = run_in_length_buckets(solve_question, test_prompts, tokenizer)
 
 
 # 8. Score for the accuracy on Test set
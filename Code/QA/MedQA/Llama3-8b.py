@@ -1,80 +1,39 @@
 import os
 #os.environ["CUDA_VISIBLE_DEVICES"] = "0"
 from typing import Optional
-import pandas as pd
 import re
 import json
 import warnings
 import datasets
 import torch
-from datasets import load_dataset, Dataset
+from datasets import load_dataset
 from peft import LoraConfig, AutoPeftModelForCausalLM, prepare_model_for_kbit_training, get_peft_model
 from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, AutoTokenizer, TrainingArguments, GenerationConfig)
 import tqdm
 from tqdm import tqdm
 import tensorrt as trt
 from trl import SFTTrainer
+from Code.utils import load_or_build_splits, run_in_length_buckets, render_prompts, generate_prompt, OPTIONS_5
+from Code.Option_Scoring import score_option_labels, predicted_options
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/mnt/nvme01/huggingface/models/MetaAI/"
 
-# 1. Load the Dataset
-dataset = load_dataset("bigbio/med_qa")
-train_data = dataset['train']
-val_data = dataset['validation']
-test_data = dataset['test']
-
-# 2. Preset the the Instruction-based prompt template
-def generate_prompt(x):
-    answer_idx = 'Nothing'
-    if x['answer_idx'] == 'A':
-        answer_idx = x['opa']
-    elif x['answer_idx'] == 'B':
-        answer_idx = x['opb']
-    elif x['answer_idx'] == 'C':
-        answer_idx = x['opc']
-    elif x['answer_idx'] == 'D':
-        answer_idx = x['opd']
-    elif x['answer_idx'] == 'E':
-        answer_idx = x['ope']
-    question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n5. {}\n'.format(x['question'], 
-                                                                          x['opa'],
-                                                                          x['opb'], 
-                                                                          x['opc'], 
-                                                                          x['opd'], 
-                                                                          x['ope'])
-    answer = answer_idx
-    prompt = f"""Question:
-    {question}
-    [INST] Solve this medical question-answering and provide the correct option. [/INST]
-    Answer: {answer} </s>""" 
-    return prompt
+# 1. Load the Dataset (only on the first run: the converted splits are cached under Dataset/Cache by load_or_build_splits)
+def load_medqa():
+    return load_dataset("bigbio/med_qa")
+
+# 2. Preset the the Instruction-based prompt template (rendered for every row at once by Code.utils.render_prompts)
+PROMPT_TEMPLATE = 'Question:\n    {question}\n' + OPTIONS_5 + '\n    [INST] Solve this medical question-answering and provide the correct option. [/INST]\n    Answer: {answer_text} </s>'
 
 def generate_and_tokenize_prompt(prompt):
-    return tokenizer(generate_prompt(prompt), padding = "max_length", truncation = True, max_length = 2048)
-
-def convert_format_df(data):
-    data_extracted = [
-    {'question' : variable['question'], 
-     'answer_idx' : variable['answer_idx'], 
-     'answer' : variable['answer'],
-     'opa' : variable['options'][0]['value'], 
-     'opb' : variable['options'][1]['value'], 
-     'opc' : variable['options'][2]['value'], 
-     'opd' : variable['options'][3]['value'], 
-     'ope' : variable['options'][4]['value']}
-    for variable in data
-    ]
-    df = pd.DataFrame(data_extracted)
-    df['text'] = df.apply(lambda x: generate_prompt(x), axis = 1)
-    data_hf = Dataset.from_pandas(df)
-    return df, data_hf
-
-train_df, train_hf = convert_format_df(train_data)
-val_df, val_hf = convert_format_df(val_data)
-test_df, test_hf = convert_format_df(test_data)
+    return tokenizer(generate_prompt(prompt, data_name = 'medqa', template = PROMPT_TEMPLATE), padding = "max_length", truncation = True, max_length = 2048)
+
+health_dataset_dict = load_or_build_splits(load_medqa, data_name = 'medqa', splits = ['train', 'validation', 'test'], template = PROMPT_TEMPLATE)
+train_hf, val_hf, test_hf = health_dataset_dict['train'], health_dataset_dict['validation'], health_dataset_dict['test']
+test_df = test_hf.to_pandas()
 
 # 3. Set the quantization settings
 bnb_config = BitsAndBytesConfig(
@@ -146,6 +105,10 @@ trainer = SFTTrainer(
 trainer.train()
 
 # 6. Test and compare the non-fine-tuned model against the fine-tuned Llama3-8B's model
+# Test prompts are the training prompt up to "Answer: " (no answer text), so the model predicts the option label there
+TEST_PROMPT_TEMPLATE = 'Question:\n    {question}\n' + OPTIONS_5 + '\n    [INST] Solve this medical question-answering and provide the correct option. [/INST]\n    Answer: '
+test_df['text'] = render_prompts(test_df, data_name = 'medqa', template = TEST_PROMPT_TEMPLATE).to_pylist()
+
 # Load the best checkpoint of Llama3-8B-Instruct
 model_id = 'Results\MedQA\Llama3-8B-Instruct\checkpoint-2548'
 tokenizer = AutoTokenizer.from_pretrained(model_id)
@@ -171,15 +134,17 @@ def solve_question(question_prompt):
     answer = tokenizer.batch_decode(outputs, skip_special_tokens = True)
     return answer
 
-all_answers = []
+# SCORE_OPTIONS ranks the five options by the log-probabilities of their labels "1".."5" right after "Answer: "
+# (one deterministic forward pass per batch, Code/Option_Scoring.py); False samples free-text answers with solve_question
+SCORE_OPTIONS = True
 test_prompts = list(test_df['text'])
-for i in tqdm.tqdm(range(0, len(test_prompts), 16)):
-    question_prompts = test_prompts[i:i+16]
-    ans = solve_question(question_prompts)
-    ans_option = []
-    for text in ans:
-        ans_option.append(re.search(r'Answer: \s*(.*)', text).group(1))
-    all_answers.extend(ans_option)
+if SCORE_OPTIONS:
+    option_scores = score_option_labels(model, tokenizer, test_prompts, batch_size = 16)
+    all_answers = predicted_options(option_scores, test_df)
+else:
+    # Batches of similar-length prompts under a token budget (Code.utils.run_in_length_buckets); answers come back in test_df order
+    answers = run_in_length_buckets(solve_question, test_prompts, tokenizer, extra_tokens = generation_config.max_new_tokens)
+    all_answers = [re.search(r'Answer: \s*(.*)', text).group(1) for text in answers]
 
 all_answers_1 = [re.sub(r'</s>|://|</s|</|s>|s/|.swing', '', answers) for answers in all_answers]
 url_pattern = r'\b\S*\.com\S*|\b\S*\.gov\S*|\b\S*\.org\S*|\b\S*\.jpg'
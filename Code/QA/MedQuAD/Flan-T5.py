@@ -4,12 +4,11 @@ os.environ["CUDA_VISIBLE_DEVICES"] = "0"
 import re
 import nltk
 import evaluate
-import pandas as pd
 import numpy as np
 import warnings
 import tqdm
 import torch
-from datasets import load_dataset, Dataset, DatasetDict
+from Code.utils import load_or_build_splits, load_medquad, MEDQUAD_CACHE_NAME
 from peft import LoraConfig, get_peft_model, TaskType, prepare_model_for_kbit_training
 from transformers import T5Tokenizer, DataCollatorForSeq2Seq, BitsAndBytesConfig
 from transformers import T5ForConditionalGeneration, Seq2SeqTrainingArguments, Seq2SeqTrainer
@@ -19,32 +18,9 @@ warnings.filterwarnings("ignore")
 
 base_folder = "D:/HuggingFace/models/Google/"
 
-# 1. Load the Dataset
-raw_data = load_dataset("lavita/MedQuAD", split = 'train')
-raw_data.set_format(type = 'pandas')
-raw_df = raw_data[:]
-temp = raw_df[~raw_df['answer'].isnull() & (raw_df['answer'] != '')]
-raw_data = Dataset.from_pandas(temp)
-temp_dataset = raw_data.train_test_split(test_size = 0.2)
-dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
-dataset.set_format(type = 'pandas')
-temp_dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['test'][:]
-test_data = temp_dataset['test'][:]
-df_train = train_data[['question', 'answer']]
-df_val = val_data[['question', 'answer']]
-df_test = test_data[['question', 'answer']]
-
-train_dataset = Dataset.from_pandas(df_train)
-val_dataset = Dataset.from_pandas(df_val)
-test_dataset = Dataset.from_pandas(df_test)
-
-health_dataset_dict = DatasetDict({
-    'train': train_dataset,
-    'validation': val_dataset,
-    'test': test_dataset
-})
+# 1. Load the Dataset (only on the first run: the random 70/10/20 split is built once and cached with the converted
+#    splits under Dataset/Cache by load_or_build_splits, so later runs reuse the same partition)
+health_dataset_dict = load_or_build_splits(load_medquad, data_name = 'medquad', splits = ['train', 'validation', 'test'], name = MEDQUAD_CACHE_NAME)
 # %%
 
 def print_number_of_trainable_model_parameters(model):
@@ -107,7 +83,8 @@ def preprocess_function(examples):
    return model_inputs
 
 # Map the preprocessing function across our dataset
-tokenized_dataset = health_dataset_dict.map(preprocess_function, batched = True)
+tokenized_dataset = load_or_build_splits(load_medquad, data_name = 'medquad', splits = ['train', 'validation', 'test'], name = MEDQUAD_CACHE_NAME,
+                                         tokenizer = tokenizer, max_length = 128, tokenize_fn = preprocess_function)
 
 metric = evaluate.load("rouge")
 
@@ -1,12 +1,11 @@
 import os
 os.environ["CUDA_VISIBLE_DEVICES"] = "1"
 from typing import Optional
-import pandas as pd
 import json
 import warnings
 import evaluate
 import torch
-from datasets import load_dataset, DatasetDict, Dataset 
+from Code.utils import load_or_build_splits, load_medquad, MEDQUAD_CACHE_NAME
 from peft import LoraConfig, prepare_model_for_kbit_training, get_peft_model
 from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, AutoTokenizer, TrainingArguments,)
 from tqdm import tqdm
@@ -18,32 +17,9 @@ warnings.filterwarnings("ignore")
 
 base_folder = "/media/lurker18/HardDrive/HuggingFace/models/MetaAI/"
 
-# 1. Load the Dataset
-raw_data = load_dataset("lavita/MedQuAD", split = 'train')
-raw_data.set_format(type = 'pandas')
-raw_df = raw_data[:]
-temp = raw_df[~raw_df['answer'].isnull() & (raw_df['answer'] != '')]
-raw_data = Dataset.from_pandas(temp)
-temp_dataset = raw_data.train_test_split(test_size = 0.2)
-dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
-dataset.set_format(type = 'pandas')
-temp_dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['test'][:]
-test_data = temp_dataset['test'][:]
-df_train = train_data[['question', 'answer']]
-df_val = val_data[['question', 'answer']]
-df_test = test_data[['question', 'answer']]
-
-train_dataset = Dataset.from_pandas(df_train)
-val_dataset = Dataset.from_pandas(df_val)
-test_dataset = Dataset.from_pandas(df_test)
-
-health_dataset_dict = DatasetDict({
-    'train': train_dataset,
-    'validation': val_dataset,
-    'test': test_dataset
-})
+# 1. Load the Dataset (only on the first run: the random 70/10/20 split is built once and cached with the converted
+#    splits under Dataset/Cache by load_or_build_splits, so later runs reuse the same partition)
+health_dataset_dict = load_or_build_splits(load_medquad, data_name = 'medquad', splits = ['train', 'validation', 'test'], name = MEDQUAD_CACHE_NAME)
 # %%
 
 def print_number_of_trainable_model_parameters(model):
@@ -112,7 +88,8 @@ def preprocess_function(examples):
    return model_inputs
 
 # Map the preprocessing function across our dataset
-tokenized_dataset = health_dataset_dict.map(preprocess_function, batched = True)
+tokenized_dataset = load_or_build_splits(load_medquad, data_name = 'medquad', splits = ['train', 'validation', 'test'], name = MEDQUAD_CACHE_NAME,
+                                         tokenizer = tokenizer, max_length = 128, tokenize_fn = preprocess_function)
 
 metric = evaluate.load("rouge")
 
@@ -156,7 +133,7 @@ training_arguments = TrainingArguments(
 # 5. Training the model
 trainer = SFTTrainer(
     model = model,
-    train_dataset = dataset,
+    train_dataset = health_dataset_dict['train'],
     peft_config = peft_config,
     dataset_text_field = "text",
     max_seq_length = 2048,
@@ -1,53 +1,25 @@
 import os
 os.environ["CUDA_VISIBLE_DEVICES"] = "3,4"
 import re
-import pandas as pd
 import warnings
 import torch
-from datasets import load_dataset, Dataset, DatasetDict
 from peft import LoraConfig, AutoPeftModelForCausalLM, prepare_model_for_kbit_training, get_peft_model
 from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, AutoTokenizer, TrainingArguments, GenerationConfig)
 import tqdm
 from tqdm import tqdm
 import tensorrt as trt
 from trl import SFTTrainer
-from Code.utils import convert_format_df
+from Code.utils import load_or_build_splits, load_medquad, MEDQUAD_CACHE_NAME
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/mnt/nvme01/huggingface/models/Facebook/"
 
-# 1. Load the Dataset
-raw_data = load_dataset("lavita/MedQuAD", split = 'train')
-raw_data.set_format(type = 'pandas')
-raw_df = raw_data[:]
-temp = raw_df[~raw_df['answer'].isnull() & (raw_df['answer'] != '')]
-raw_data = Dataset.from_pandas(temp)
-temp_dataset = raw_data.train_test_split(test_size = 0.2)
-dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
-dataset.set_format(type = 'pandas')
-temp_dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['test'][:]
-test_data = temp_dataset['test'][:]
-df_train = train_data[['question', 'answer']]
-df_val = val_data[['question', 'answer']]
-df_test = test_data[['question', 'answer']]
-
-train_dataset = Dataset.from_pandas(df_train)
-val_dataset = Dataset.from_pandas(df_val)
-test_dataset = Dataset.from_pandas(df_test)
-
-train_df, train_hf = convert_format_df(train_dataset, data_name = 'medquad')
-val_df, val_hf = convert_format_df(val_dataset, data_name = 'medquad')
-test_df, test_hf = convert_format_df(test_dataset, data_name = 'medquad')
-
-health_dataset_dict = DatasetDict({
-    'train': train_hf,
-    'validation': val_hf,
-    'test': test_hf
-})
+# 1. Load the Dataset (only on the first run: the random 70/10/20 split is built once and cached with the converted
+#    splits under Dataset/Cache by load_or_build_splits, so later runs reuse the same partition)
+health_dataset_dict = load_or_build_splits(load_medquad, data_name = 'medquad', splits = ['train', 'validation', 'test'], name = MEDQUAD_CACHE_NAME)
+train_hf, val_hf, test_hf = health_dataset_dict['train'], health_dataset_dict['validation'], health_dataset_dict['test']
 
 def print_number_of_trainable_model_parameters(model):
     trainable_model_params = 0
@@ -17,39 +17,33 @@ import rouge_score
 import sacrebleu
 import numpy as np
 import tensorrt as trt
-from Code.utils import convert_format_df
+from Code.utils import load_or_build_splits
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/mnt/nvme01/huggingface/models/Google/"
 
-# 1. Load the Dataset
-dataset = load_dataset("bigbio/pubmed_qa")
-dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['validation'][:]
-
-data = pd.concat([train_data, val_data]).reset_index()
-del data['index']
-raw_dataset = Dataset.from_pandas(data)
-temp_dataset = raw_dataset.train_test_split(test_size = 0.2)
-dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
-dataset.set_format(type = 'pandas')
-temp_dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-test_data = temp_dataset['test'][:]
+# 1. Load the Dataset (only on the first run: the converted splits, including the random re-split below, are cached
+#    under Dataset/Cache by load_or_build_splits)
+def load_pubmedqa():
+    dataset = load_dataset("bigbio/pubmed_qa")
+    dataset.set_format(type = 'pandas')
+    train_data = dataset['train'][:]
+    val_data = dataset['validation'][:]
+
+    data = pd.concat([train_data, val_data]).reset_index()
+    del data['index']
+    raw_dataset = Dataset.from_pandas(data)
+    temp_dataset = raw_dataset.train_test_split(test_size = 0.2)
+    dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
+    dataset.set_format(type = 'pandas')
+    train_data = dataset['train'][:]
+    return {'train' : train_data, 'validation' : val_data, 'test' : val_data}
 
 # 2. Preset the the Instruction-based prompt template
-train_df, train_hf = convert_format_df(train_data, data_name = 'pubmedqa')
-val_df, val_hf = convert_format_df(val_data, data_name = 'pubmedqa')
-test_df, test_hf = convert_format_df(val_data, data_name = 'pubmedqa')
-
-health_dataset_dict = DatasetDict({
-    'train': train_hf,
-    'validation': val_hf,
-    'test': test_hf
-})
+health_dataset_dict = load_or_build_splits(load_pubmedqa, data_name = 'pubmedqa', splits = ['train', 'validation', 'test'], name = 'pubmedqa-resplit')
+train_hf, val_hf, test_hf = health_dataset_dict['train'], health_dataset_dict['validation'], health_dataset_dict['test']
 
 
 def print_number_of_trainable_model_parameters(model):
@@ -113,7 +107,9 @@ def preprocess_function(examples):
    model_inputs["labels"] = labels["input_ids"]
    return model_inputs
 
-tokenized_dataset = health_dataset_dict.map(preprocess_function, batched = True)
+# Tokenized splits are cached too (keyed by the tokenizer and the input max_length of preprocess_function)
+tokenized_dataset = load_or_build_splits(load_pubmedqa, data_name = 'pubmedqa', splits = ['train', 'validation', 'test'], name = 'pubmedqa-resplit',
+                                         tokenizer = tokenizer, max_length = 512, tokenize_fn = preprocess_function)
 
 metric = evaluate.load("rouge")
 
@@ -14,25 +14,19 @@ import tqdm
 from tqdm import tqdm
 import tensorrt as trt
 from trl import SFTTrainer
-from Code.utils import convert_format_df, generate_prompt
+from Code.utils import load_or_build_splits, run_in_length_buckets
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/media/lurker18/HardDrive/HuggingFace/models/MetaAI/"
 
-# 1. Load the Dataset
-dataset = load_dataset("bigbio/pubmed_qa")
-dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['validation'][:]
+# 1. Load the Dataset (only on the first run: the converted splits are cached under Dataset/Cache by load_or_build_splits)
+def load_pubmedqa():
+    return load_dataset("bigbio/pubmed_qa")
 
-train_df, train_hf = convert_format_df(train_data, data_name = 'pubmedqa')
-val_df, val_hf = convert_format_df(val_data, data_name = 'pubmedqa')
-
-# 2. Preset the the Instruction-based prompt template
-train_df['text'] = train_df.apply(lambda x: generate_prompt(x, data_name = 'pubmedqa'), axis = 1)
-val_df['text'] = val_df.apply(lambda x: generate_prompt(x, data_name = 'pubmedqa'), axis = 1)
+health_dataset_dict = load_or_build_splits(load_pubmedqa, data_name = 'pubmedqa', splits = ['train', 'validation'])
+train_hf, val_hf = health_dataset_dict['train'], health_dataset_dict['validation']
 
 # 3. Set the quantization settings
 bnb_config = BitsAndBytesConfig(
@@ -129,15 +123,10 @@ def solve_question(question_prompt):
     answer = tokenizer.batch_decode(outputs, skip_special_tokens = True)
     return answer
 
-all_answers = []
 test_prompts = list(test_df['text'])
-for i in tqdm.tqdm(range(0, len(test_prompts), 16)):
-    question_prompts = test_prompts[i:i+16]
-    ans = solve_question(question_prompts)
-    ans_option = []
-    for text in ans:
-        ans_option.append(re.search(r'Answer: \s*(.*)', text).group(1))
-    all_answers.extend(ans_option)
+# Batches of similar-length prompts under a token budget (Code.utils.run_in_length_buckets); answers come back in test_df order
+answers = run_in_length_buckets(solve_question, test_prompts, tokenizer, extra_tokens = generation_config.max_new_tokens)
+all_answers = [re.search(r'Answer: \s*(.*)', text).group(1) for text in answers]
 
 all_answers_1 = [re.sub(r'</s>|://|</s|</|s>|s/|.swing', '', answers) for answers in all_answers]
 url_pattern = r'\b\S*\.com\S*|\b\S*\.gov\S*|\b\S*\.org\S*|\b\S*\.jpg'
@@ -11,22 +11,20 @@ import tqdm
 from tqdm import tqdm
 import tensorrt as trt
 from trl import SFTTrainer
-from Code.utils import convert_format_df
+from Code.utils import load_or_build_splits
 
 os.environ["WANDB_DISABLED"] = "true"
 warnings.filterwarnings("ignore")
 
 base_folder = "/mnt/nvme01/huggingface/models/MistralAI/"
 
-# 1. Load the Dataset
-dataset = load_dataset("bigbio/pubmed_qa")
-dataset.set_format(type = 'pandas')
-train_data = dataset['train'][:]
-val_data = dataset['validation'][:]
+# 1. Load the Dataset (only on the first run: the converted splits are cached under Dataset/Cache by load_or_build_splits)
+def load_pubmedqa():
+    return load_dataset("bigbio/pubmed_qa")
 
 # 2. Preset the the Instruction-based prompt template
-train_df, train_hf = convert_format_df(train_data, data_name = 'pubmedqa')
-val_df, val_hf = convert_format_df(val_data, data_name = 'pubmedqa')
+health_dataset_dict = load_or_build_splits(load_pubmedqa, data_name = 'pubmedqa', splits = ['train', 'validation'])
+train_hf, val_hf = health_dataset_dict['train'], health_dataset_dict['validation']
 
 # 3. Set the quantization settings
 bnb_config = BitsAndBytesConfig(
@@ -1,20 +1,24 @@
 import os 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import re
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, AutoModel
+import asyncio
+from transformers import AutoTokenizer, BitsAndBytesConfig, AutoModel
 import torch
+import numpy as np
 import pandas as pd
 from datasets import load_dataset
-from peft import LoraConfig, prepare_model_for_kbit_training, get_peft_model
-from langchain_community.document_loaders import CSVLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
+
+from Code.RAG.acronym_index import AcronymIndex, ACRONYM_INDEX_PATH, build_acronym_index, collect_acronyms
+from Code.RAG.inference import load_model_for_inference
+from Code.RAG.langchain_utils import CachedEmbeddings, build_or_load_faiss_index, build_or_load_bm25_index, faiss_index_folder
+from Code.RAG.retrieval import reciprocal_rank_fusion
+from Code.RAG.serving import MicroBatchingServer, serve_http
 
 base_folder = '/media/lurker18/Local Disk/HuggingFace/models/MetaAI/'
 embedding_folder = '/media/lurker18/Local Disk/HuggingFace/models/Sentence-Transformers/'
 # Define the Prediction Function
-def predict_llama3(prompt, system_prompt):
+def build_llama3_prompt(prompt, system_prompt):
     chat = [
         {"role":"user", "content":f"""You are a helpful chatbot. Use the following information about MedQuAD to answer this question\n" "Do not use any other information. Only base your answer on the given context.\n" "In case you are not sure if your answer is correct with more than 70 percent accuaracy: respond with the following text: I am not sure if I can answer this correctly. Can you please try to rephrase the question?" "Give a complete and well explained answer but provide context within the limits of the information provided here.\n" "Here's the question:\n{prompt}"""},
     ]
@@ -23,37 +27,14 @@ def predict_llama3(prompt, system_prompt):
         chat = [
             {"role":"user", "content":f"{prompt}"}
         ]
-    prompt = tokenizer.apply_chat_template(chat, tokenize = False, add_generation_prompt = True)
-    inputs = tokenizer.encode(prompt, add_special_tokens = False, return_tensors = "pt").to("cuda")
-    outputs = model.generate(inputs = inputs, max_new_tokens = 500)
-    return tokenizer.decode(outputs[0], skip_special_tokens = True)
+    return tokenizer.apply_chat_template(chat, tokenize = False, add_generation_prompt = True)
 
-# Get the answers seperately from the Prediction
-def isolate_answer(input_string):
-    # Split the input string by newline characters
-    lines = input_string.split("\n")
-
-    # Initialize variabels for storing roles and responses
-    current_role = None
-    response = ""
-
-    # Iterate over each line
-    for line in lines:
-        if line == "assistant":
-            # If the line contains "model", store the corresponding response
-            current_role = "assistant"
-            response += line + '\n'
-        elif current_role == 'assistant':
-            # Accumulate the resposne untial reaching a new role or end of string
-            response += line + '\n'
-            if 'User:' in line or len(lines) == lines.index(line) + 1:
-                lines1 = response.split('\n')
-                lines1[0] = ''
-                finalresponse = ''
-                for r in lines1:
-                    finalresponse += r + '\n'
-                # Once reached the user's line or end of the string, return the extracted response
-                return finalresponse
+def predict_llama3(prompt, system_prompt):
+    prompt = build_llama3_prompt(prompt, system_prompt)
+    inputs = tokenizer.encode(prompt, add_special_tokens = False, return_tensors = "pt").to(model.device)
+    with torch.inference_mode():
+        outputs = model.generate(inputs = inputs, max_new_tokens = 500)
+    return tokenizer.decode(outputs[0], skip_special_tokens = True)
 
 # 2. Select the tokenizer model
 tokenizer = AutoTokenizer.from_pretrained(base_folder + "Llama_3_8B_Instruct", padding = "max_length" , truncation = True)
@@ -69,41 +50,23 @@ bnb_config = BitsAndBytesConfig(
 )
 
 # 4. Select the MetaAI's Llama3-8B-chat model
-model = AutoModelForCausalLM.from_pretrained(
+# Inference-only loading: KV cache on, eval mode, no gradients and no training-only LoRA wrapper.
+# To serve a fine-tuned model, pass its checkpoint as adapter_path and the LoRA weights are merged into the base.
+model = load_model_for_inference(
     base_folder + "Llama_3_8B_Instruct",
+    adapter_path = None,
     quantization_config = bnb_config,
     attn_implementation = "flash_attention_2",
     torch_dtype = torch.float16,
     device_map = "auto",
-    use_auth_token = False,
 )
-model.config.use_cache = False
 model.config.pretraining_tp = 1
-model = prepare_model_for_kbit_training(model)
-peft_config = LoraConfig(
-    lora_alpha = 32,
-    lora_dropout = 0.05,
-    r = 16,
-    bias = "none",
-    task_type = "CAUSAL_LM",
-    target_modules = ['up_proj', 'down_proj', 'gate_proj', 'k_proj', 'q_proj', 'v_proj', 'o_proj']
-)
-model = get_peft_model(model, peft_config)
 
 # Test a question
 ans = predict_llama3("who are you", "")
 print(ans)
 
-# 5. Load the datasets
-documents = []
-csv_loader = CSVLoader('Dataset/MedQuAD[clean].csv')
-documents = csv_loader.load()
-splitter = RecursiveCharacterTextSplitter(chunk_size = 500, chunk_overlap = 100, add_start_index = True)
-all_splits = splitter.split_documents(documents)
-
-len(all_splits)
-
-# 6. Load an Embedding Model
+# 5. Load an Embedding Model
 
 model_kwargs = {'device' : 'cuda', 'trust_remote_code' : True}
 encode_kwargs = {'normalize_embeddings' : False}
@@ -111,23 +74,61 @@ embeddings = HuggingFaceEmbeddings(model_name = embedding_folder + 'all-MiniLM-L
                                    model_kwargs = model_kwargs,
                                    encode_kwargs = encode_kwargs)
 
+# Reuse vectors of chunks embedded on previous runs (keyed by model name + normalized chunk text hash)
+embeddings = CachedEmbeddings(embeddings, cache_dir = 'embedding_cache')
+
 
-# 7. Gather and distribute into neat vectorized database for Q&A Preparation
-db = FAISS.from_documents(all_splits, embeddings)
+# 6. Load the datasets and gather them into a neat vectorized database for Q&A Preparation
+# The index + docstore are built once and saved under faiss_index/<key>, where the key covers the CSV content,
+# the splitter parameters and the embedding model; later runs memory-map the saved index (a stale one is rebuilt)
+db = build_or_load_faiss_index('Dataset/MedQuAD[clean].csv',
+                               embeddings,
+                               index_dir = 'faiss_index',
+                               chunk_size = 500,
+                               chunk_overlap = 100)
 
 test = db.similarity_search('What is (are) Trigeminal Neuralgia')
 #print(test[0].page_content)
 
-retriever = db.as_retriever()
+# 7. Hybrid retrieval: dense FAISS hits and BM25 hits (exact acronyms such as "AAA" or "BRCA1" that MiniLM misses)
+# are fused with reciprocal rank fusion. The BM25 index is built once and saved next to the FAISS index.
+sparse_index = build_or_load_bm25_index(db, faiss_index_folder('Dataset/MedQuAD[clean].csv', embeddings, 'faiss_index', 500, 100))
+
+# Acronyms in questions ("AAA", "COPD") are expanded with the long forms mined from the scraped dictionaries
+# (Monash, Wikipedia, nhsinform) before embedding; the compiled index is built once and loads in milliseconds
+if not os.path.exists(ACRONYM_INDEX_PATH):
+    build_acronym_index(collect_acronyms())
+acronym_index = AcronymIndex(ACRONYM_INDEX_PATH)
+
+def retrieve_contexts(questions, k = 4, num_candidates = 50):
+    questions = [acronym_index.expand_query(question) for question in questions]
+    query_vectors = np.asarray(embeddings.embed_queries(questions), dtype = np.float32)
+    _, dense_indices = db.index.search(query_vectors, num_candidates)
+    _, sparse_indices = sparse_index.search_batch(questions, k = num_candidates)
+    _, fused_indices = reciprocal_rank_fusion([dense_indices, sparse_indices], k = k)
+    return ["".join(db.docstore.search(db.index_to_docstore_id[int(i)]).page_content + '\n' for i in row if i >= 0) for row in fused_indices]
 
 def predict_RAG(prompt):
-    context = retriever.get_relevant_documents(prompt)
-    context_str = ""
-    for document in context:
-        context_str += document.page_content + '\n'
+    context_str = retrieve_contexts([prompt])[0]
     return predict_llama3(prompt, context_str)
 
 
 question = "What is (are) keratoderma with woolly hair?"
 answer = predict_RAG(question)
-print(answer)
\ No newline at end of file
+print(answer)
+
+
+# 8. Serve predict_RAG over HTTP with micro-batching (POST {"question": "..."} to /predict)
+# Questions are queued, retrieved for as a batch and generated in left-padded, length-bucketed batches
+# Measure p50/p99 latency and throughput with Code/Benchmarks/Load_Generator.py
+serve_rag = False
+if serve_rag:
+    server = MicroBatchingServer(model = model,
+                                 tokenizer = tokenizer,
+                                 retrieve_fn = retrieve_contexts,
+                                 build_prompt_fn = build_llama3_prompt,
+                                 max_batch_size = 8,
+                                 max_wait_ms = 50,
+                                 bucket_width = 128,
+                                 max_new_tokens = 500)
+    asyncio.run(serve_http(server, host = "127.0.0.1", port = 8000))
@@ -33,6 +33,15 @@ from sentence_transformers import util, SentenceTransformer
 from time import perf_counter as timer
 import matplotlib.pyplot as plt
 
+from Code.RAG.ingestion import iter_pdf_pages, iter_page_sentences
+from Code.RAG.chunking import iter_token_chunks
+from Code.RAG.embedding_cache import EmbeddingCache, encode_with_cache
+from Code.RAG.embedding_store import save_embedding_store, load_embedding_store
+from Code.RAG.vector_index import build_index, load_index, recall_at_k
+from Code.RAG.sparse_index import BM25Index
+from Code.RAG.retrieval import retrieve_batch, hybrid_retrieve_batch
+from Code.RAG.acronym_index import AcronymIndex, ACRONYM_INDEX_PATH, build_acronym_index, collect_acronyms
+
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, AutoModelForSeq2SeqLM
 from transformers.utils import is_flash_attn_2_available
 
@@ -67,26 +76,17 @@ else:
     print(f"File {pdf_path} exists.")
     
 
-def text_formatter(text: str) -> str:
-    """Performs minor formatting on text."""
-    cleaned_text = text.replace("\n", " ").strip()
-    
-    # Potentially more text formatting functions can go here
-    return cleaned_text
-
-def open_and_read_pdf(pdf_path: str) -> list[dict]:
-    doc = fitz.open(pdf_path)
-    pages_and_texts = []
-    for page_number, page in tqdm(enumerate(doc)):
-        text = page.get_text()
-        text = text_formatter(text = text)
-        pages_and_texts.append({"page_number": page_number - 41,
-                                "page_char_count": len(text),
-                                "page_word_count" : len(text.split(" ")),
-                                "page_sentence_count_raw": len(text.split(". ")),
-                                "page_token_count" : len(text) / 4, # 1 token = ~4 characters
-                                "text" : text})
-    return pages_and_texts
+def open_and_read_pdf(pdf_path: str, num_workers: int = None) -> list[dict]:
+    """
+    Reads every page of a PDF (or a directory of PDFs) with a pool of num_workers processes (None = one per CPU),
+    see Code/RAG/ingestion.py. The pool relies on the fork start method (the Linux default); on Windows/macOS, where
+    workers are spawned and re-import this script, either wrap the script in an if __name__ == "__main__" guard or
+    pass num_workers = 1 to read serially.
+    The 41-page front matter offset only applies to human-nutrition-text.pdf; other PDFs keep their 0-based page index.
+    For very large collections, iterate over iter_pdf_pages directly to keep memory flat.
+    """
+    page_offset = {"human-nutrition-text.pdf" : 41}
+    return list(tqdm(iter_pdf_pages(pdf_path, num_workers = num_workers, page_offset = page_offset)))
 
 pages_and_texts = open_and_read_pdf(pdf_path = pdf_path)
 pages_and_texts[:2]
@@ -113,14 +113,13 @@ assert len(list(doc.sents)) == 3
 list(doc.sents)
 
 pages_and_texts[600]
-for item in tqdm(pages_and_texts):
-    item["sentences"] = list(nlp(item["text"]).sents)
-    
-    # Make sure all sentences are strings (the default type is a spaCy datatype)
-    item["sentences"] = [str(sentence) for sentence in item["sentences"]]
-    
-    # Count the sentences
-    item["page_sentence_count_spacy"] = len(item["sentences"])
+# Segment every page with nlp.pipe (batched, optionally multi-process) instead of one nlp() call per page
+# Each item gets "sentences" (as strings, not spaCy spans) and "page_sentence_count_spacy"
+pages_and_texts = list(tqdm(iter_page_sentences(pages_and_texts,
+                                                nlp = nlp,
+                                                batch_size = 64,
+                                                n_process = 1),
+                            total = len(pages_and_texts)))
     
 random.sample(pages_and_texts, k = 1)
 
@@ -129,50 +128,19 @@ df.describe().round(2)
 
 
 ### Chunking our sentences together
-# Define split size to turn groups of sentences into chunks
-num_sentence_chunk_size = 10
- 
-# Create a function to split lists of texts recursively into chunk size
-# e.g. [20] -> [10, 10] or [25] -> [10, 10, 5]
-def split_list(input_list: list[str],
-               slice_size: int = num_sentence_chunk_size) -> list[list[str]]:
-    return [input_list[i : i + slice_size] for i in range(0, len(input_list), slice_size)]
-
-test_list = list(range(25))
-split_list(test_list)
-
-# Loop through pages and texts and split sentences into chunks
-for item in tqdm(pages_and_texts):
-    item["sentence_chunks"] = split_list(input_list = item["sentences"],
-                                         slice_size = num_sentence_chunk_size)
-    
-    item["num_chunks"] = len(item["sentence_chunks"])
-    
-random.sample(pages_and_texts, k = 1)
-
-df = pd.DataFrame(pages_and_texts)
-df.describe().round(2)
+# Pack sentences into chunks using the embedding model's real tokenizer instead of a fixed number of sentences
+# and the "1 token = ~4 chars" estimate, so no chunk overflows (and gets silently truncated by) the 256-token window
+embedding_model_id = "sentence-transformers/all-MiniLM-L12-v2"
+chunk_tokenizer = AutoTokenizer.from_pretrained(pretrained_model_name_or_path = embedding_model_id)
+max_chunk_tokens = 256 # all-MiniLM-L12-v2 max_seq_length
+chunk_overlap_tokens = 32 # repeat up to 32 tokens of trailing sentences at the start of the next chunk
 
 ### Splitting each chunk into its own item
-# Split each chunk into its own item
-pages_and_chunks = []
-for item in tqdm(pages_and_texts):
-    for sentence_chunk in item["sentence_chunks"]:
-        chunk_dict = {}
-        chunk_dict["page_number"] = item["page_number"]
-        
-        # Join the sentences together into a paragraph-like structure, aka join the list of sentences into one paragraph
-        joined_sentence_chunk = "".join(sentence_chunk).replace("  ", " ").strip()
-        joined_sentence_chunk = re.sub(r"\.([A-Z])", r". \1", joined_sentence_chunk) # ".A" => ". A" (will work for any capital letter)
-        
-        chunk_dict["sentence_chunk"] = joined_sentence_chunk
-        
-        # Get some stats on our chunks
-        chunk_dict["chunk_char_count"] = len(joined_sentence_chunk)
-        chunk_dict["chunk_word_count"] = len([word for word in joined_sentence_chunk.split(" ")])
-        chunk_dict["chunk_token_count"] = len(joined_sentence_chunk) / 4 # 1 token = ~4 chars
-        
-        pages_and_chunks.append(chunk_dict)
+# Sentences of many pages are tokenized with one batched fast tokenizer call
+pages_and_chunks = list(tqdm(iter_token_chunks(pages_and_texts,
+                                               tokenizer = chunk_tokenizer,
+                                               max_tokens = max_chunk_tokens,
+                                               overlap_tokens = chunk_overlap_tokens)))
         
 len(pages_and_chunks)
 
@@ -187,7 +155,7 @@ min_token_length = 30
 for row in df[df["chunk_token_count"] <= min_token_length].sample(5).iterrows():
     print(f'Chunk token count: {row[1]["chunk_token_count"]} | Text: {row[1]["sentence_chunk"]}')
     
-# Filter our DataFrame for rows with under 30 tokens
+# Filter our DataFrame for rows with under 30 tokens (real token counts)
 pages_and_chunks_over_min_token_len = df[df["chunk_token_count"] > min_token_length].to_dict(orient = "records")
 pages_and_chunks_over_min_token_len[:2]
 
@@ -213,31 +181,31 @@ for sentence, embedding in embeddings_dict.items():
     print("")
     
     
-# Embed each chunk one by one
-for item in tqdm(pages_and_chunks_over_min_token_len):
-    item["embedding"] = embedding_model.encode(item["sentence_chunk"])
-    
 text_chunks = [item["sentence_chunk"] for item in pages_and_chunks_over_min_token_len]
 text_chunks[419]
 
 len(text_chunks)
 
-# Embed all texts in batches
-text_chunk_embeddings = embedding_model.encode(text_chunks,
-                                               batch_size = 128, # You can experiment to find which batch size leads to best results
-                                               convert_to_tensor = True)
+# Embed all texts in batches, once. Chunks embedded on a previous run are read from the cache,
+# keyed by (embedding model name, hash of the normalized chunk text), so only new/changed chunks are encoded
+embedding_cache = EmbeddingCache(cache_dir = "embedding_cache", model_name = "all-MiniLM-L12-v2")
+text_chunk_embeddings = torch.from_numpy(encode_with_cache(model = embedding_model,
+                                                           texts = text_chunks,
+                                                           cache = embedding_cache,
+                                                           batch_size = 128)) # You can experiment to find which batch size leads to best results
 text_chunk_embeddings
 
 ### Save embeddings to file
-# Save embeddings to file
-text_chunks_and_embeddings_df = pd.DataFrame(pages_and_chunks_over_min_token_len)
-text_chunks_and_embeddings_df
-embeddings_df_save_path = "text_chunks_and_embeddings_df.csv"
-text_chunks_and_embeddings_df.to_csv(embeddings_df_save_path, index = False, encoding = 'utf-8-sig')
+# Save embeddings as a binary matrix (.npy) plus a columnar metadata file instead of a CSV of stringified arrays
+embeddings_store_path = "text_chunks_and_embeddings"
+save_embedding_store(pages_and_chunks = pages_and_chunks_over_min_token_len,
+                     embeddings = text_chunk_embeddings,
+                     store_dir = embeddings_store_path,
+                     dtype = "float32")
 
 
 # Import saved file and view
-text_chunks_and_embeddings_df_load = pd.read_csv(embeddings_df_save_path)
+_, text_chunks_and_embeddings_df_load = load_embedding_store(embeddings_store_path)
 text_chunks_and_embeddings_df_load.head()
 
 
@@ -245,17 +213,12 @@ text_chunks_and_embeddings_df_load.head()
 # RAG goal: Retrieve relevant passages based on a query and use those passages to augment an input to an LLM so it can generate an output based on those relevant passages.
 
 ### Similarity search
-# Import texts and embedding df
-text_chunks_and_embedding_df = pd.read_csv("text_chunks_and_embeddings_df.csv")
-
-# Convert embedding column back to np.array(it got converted to string when it saved to CSV)
-text_chunks_and_embedding_df["embedding"] = text_chunks_and_embedding_df["embedding"].apply(lambda x : np.fromstring(x.strip("[]"), sep = " "))
-
-# Convert our embeddings into a torch.tensor
-embeddings = torch.tensor(np.stack(text_chunks_and_embedding_df["embedding"].tolist(), axis = 0), dtype = torch.float32).to(device)
+# Import texts and embeddings (the matrix is memory-mapped, so nothing is parsed from text)
+embeddings, text_chunks_and_embedding_df = load_embedding_store(store_dir = embeddings_store_path,
+                                                                device = device)
 
 # Convert texts and embedding df to list of dicts
-pages_and_chunks = text_chunks_and_embeddings_df.to_dict(orient = "records")
+pages_and_chunks = text_chunks_and_embedding_df.to_dict(orient = "records")
 pages_and_chunks
 
 
@@ -358,14 +321,25 @@ def retrieve_relevant_resources(query: str,
                                 embeddings: torch.tensor,
                                 model: SentenceTransformer = embedding_model,
                                 n_resources_to_return: int = 10,
-                                print_time: bool = True):
+                                print_time: bool = True,
+                                index = None):
     """
     Embeds a query with model and returns top k scores and indices from embeddings.
+    If an index (see Code/RAG/vector_index.py) is given, it is searched instead of scoring every embedding.
     """
     
     # Embed the query
     query_embedding = model.encode(query, convert_to_tensor = True)
     
+    if index is not None:
+        start_time = timer()
+        scores, indices = index.search(query_embedding, k = n_resources_to_return)
+        end_time = timer()
+        
+        if print_time:
+            print(f"[INFO] Time taken to search {index.kind} index ({len(index)} embeddings): {end_time-start_time:.5f} seconds.")
+        return scores[0], indices[0]
+    
     # Get dot product scores on embeddings
     start_time = timer()
     dot_scores = util.dot_score(query_embedding, embeddings)[0]
@@ -382,6 +356,17 @@ def retrieve_relevant_resources(query: str,
 
 retrieve_relevant_resources(query = "foods high in fiber", embeddings = embeddings)
 
+### Approximate nearest-neighbour index (built once and saved next to the embeddings)
+# "flat" = exact search, "hnsw" = graph index, "ivfpq" = compressed inverted-file index (needs >= ~40 * nlist chunks to train)
+index = build_index(embeddings, kind = "hnsw", store_dir = embeddings_store_path, M = 32, ef_construction = 200, ef_search = 64)
+index = load_index(embeddings_store_path)
+
+# Check the speed/accuracy tradeoff against the exact dot product path
+eval_queries = ["foods high in fiber", "good foods for protein", "water soluble vitamins", "symptoms of iron deficiency"]
+print(recall_at_k(index, embedding_model.encode(eval_queries, convert_to_tensor = True), embeddings, k = 5))
+
+retrieve_relevant_resources(query = "foods high in fiber", embeddings = embeddings, index = index)
+
 def print_top_results_and_scores(query: str,
                                  embeddings: torch.tensor,
                                  pages_and_chunks: list[dict] = pages_and_chunks,
@@ -406,6 +391,55 @@ def print_top_results_and_scores(query: str,
 query = "foods high in fiber"
 print_top_results_and_scores(query = query, embeddings = embeddings)
 
+### Batched retrieval for many queries at once (e.g. offline evaluation over a QA test set)
+# One encode call for every query + one matrix multiply instead of a retrieve_relevant_resources call per query
+queries = ["foods high in fiber", "good foods for protein", "water soluble vitamins", "symptoms of iron deficiency"]
+start_time = timer()
+batch_scores, batch_indices = retrieve_batch(queries = queries,
+                                             embeddings = embeddings,
+                                             model = embedding_model,
+                                             k = 5)
+end_time = timer()
+print(f"[INFO] Time taken to retrieve {len(queries)} queries in one batch: {end_time-start_time:.5f} seconds.")
+
+for query, scores, indices in zip(queries, batch_scores, batch_indices):
+    print(f"Query: '{query}'")
+    for score, idx in zip(scores, indices):
+        print(f"Score: {score:.4f} | Page number: {pages_and_chunks[idx]['page_number']}")
+    print("\n")
+
+### Hybrid sparse (BM25) + dense retrieval
+# Dense MiniLM embeddings miss exact acronyms and gene names ("AAA", "BRCA1", "GSK-3beta"); a BM25 inverted index
+# over the same chunks (built once, saved next to the embeddings) catches them. Both rankings are fused with reciprocal rank fusion.
+sparse_index_path = os.path.join(embeddings_store_path, "bm25")
+BM25Index().build([item["sentence_chunk"] for item in pages_and_chunks]).save(sparse_index_path)
+sparse_index = BM25Index.load(sparse_index_path)
+
+hybrid_scores, hybrid_indices = hybrid_retrieve_batch(queries = queries,
+                                                      embeddings = embeddings,
+                                                      model = embedding_model,
+                                                      sparse_index = sparse_index,
+                                                      k = 5,
+                                                      num_candidates = 50)
+for query, scores, indices in zip(queries, hybrid_scores, hybrid_indices):
+    print(f"Query: '{query}'")
+    for score, idx in zip(scores, indices):
+        print(f"RRF score: {score:.4f} | Page number: {pages_and_chunks[idx]['page_number']}")
+    print("\n")
+
+### Acronym expansion before embedding
+# "AAA" on its own embeds poorly; appending the long form ("AAA (abdominal aortic aneurysm)") gives the dense model
+# something to match while BM25 still sees the acronym. The compiled index is built once from the scraped dictionaries.
+if not os.path.exists(ACRONYM_INDEX_PATH):
+    build_acronym_index(collect_acronyms())
+acronym_index = AcronymIndex(ACRONYM_INDEX_PATH)
+expanded_queries = [acronym_index.expand_query(query) for query in ["vitamin D and RDA", "iron deficiency and IDA"]]
+print(expanded_queries)
+expanded_scores, expanded_indices = retrieve_batch(queries = expanded_queries,
+                                                   embeddings = embeddings,
+                                                   model = embedding_model,
+                                                   k = 5)
+
 
 ### Getting an LLM for local generation
 # Checking our local GPU memory availability
@@ -0,0 +1,168 @@
+import os
+import re
+import hashlib
+import numpy as np
+import pandas as pd
+from collections import Counter, defaultdict
+
+# Scraped dictionaries (Keyword/Word, Definition) and the prebuilt index
+MONASH_PATH = "Dataset/Scraped/Monash/Biomedical_Terms.json"
+WIKIPEDIA_PATH = "Dataset/Scraped/Wikipedia/List_of_Abbreviation_of_Diseases_and_Disorders.csv"
+NHSINFORM_PATH = "Dataset/Scraped/nhsinform/List_of_Disease_Dictionary.json"
+ACRONYM_INDEX_PATH = "Dataset/Scraped/acronym_index.npz"
+
+# "(AAA)", "(BRCA1)", "(GSK-3beta)": 2-12 characters with at least one capital letter
+PARENTHESIS_PATTERN = re.compile(r"\(([A-Za-z0-9][A-Za-z0-9\-]{1,11})\)")
+# Query tokens that look like acronyms: contain a capital letter after the first character or mix capitals and digits
+ACRONYM_PATTERN = re.compile(r"\b[A-Za-z0-9]*[A-Z][A-Za-z0-9\-]*[A-Z0-9][A-Za-z0-9\-]*\b")
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size = 8).digest(), "little")
+
+def _best_long_form(short_form: str, long_form: str):
+    """
+    Schwartz & Hearst (2003): match the characters of the short form right-to-left inside the preceding text;
+    the first character must start a word. Returns the long form or None.
+    """
+    s_index, l_index = len(short_form) - 1, len(long_form) - 1
+    while s_index >= 0:
+        c = short_form[s_index].lower()
+        if not c.isalnum():
+            s_index -= 1
+            continue
+        while (l_index >= 0 and long_form[l_index].lower() != c) or (s_index == 0 and l_index > 0 and long_form[l_index - 1].isalnum()):
+            l_index -= 1
+        if l_index < 0:
+            return None
+        l_index -= 1
+        s_index -= 1
+    l_index = long_form.rfind(" ", 0, l_index + 1) + 1
+    return long_form[l_index:].strip()
+
+def extract_acronyms(text: str) -> list[tuple[str, str]]:
+    """(acronym, expansion) pairs defined in text as "long form (ACRONYM)"."""
+    pairs = []
+    for match in PARENTHESIS_PATTERN.finditer(text):
+        short_form = match.group(1)
+        if not any(c.isupper() for c in short_form) or not short_form[0].isalnum():
+            continue
+        # Candidate long form: at most min(|A| + 5, 2|A|) words before the parenthesis (Schwartz & Hearst)
+        words = text[: match.start()].rstrip().split(" ")
+        max_words = min(len(short_form) + 5, 2 * len(short_form))
+        long_form = _best_long_form(short_form, " ".join(words[-max_words:]))
+        if long_form and len(long_form) > len(short_form) and long_form.lower() != short_form.lower():
+            pairs.append((short_form, long_form.strip(" ,;:")))
+    return pairs
+
+def _is_lfs_pointer(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(40).startswith(b"version https://git-lfs")
+
+def _read_dictionary(path: str) -> pd.DataFrame:
+    # Same readers as Preprocessing.py / Create_Annotation.py; the first two columns are (Keyword, Definition)
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, encoding = "utf-8")
+    else:
+        df = pd.read_json(path, lines = True)
+    df = df.iloc[:, :2]
+    df.columns = ["Keyword", "Definition"]
+    return df.dropna()
+
+def collect_acronyms(monash_path: str = MONASH_PATH,
+                     wikipedia_path: str = WIKIPEDIA_PATH,
+                     nhsinform_path: str = NHSINFORM_PATH) -> dict[str, list[str]]:
+    """acronym -> expansions (most frequent first) from the scraped dictionaries."""
+    counts = defaultdict(Counter)
+    for path in (monash_path, nhsinform_path):
+        if not os.path.exists(path) or _is_lfs_pointer(path):
+            print(f"[INFO] Skipping {path} (missing or not fetched from git-lfs)")
+            continue
+        df = _read_dictionary(path)
+        for definition in df["Definition"].astype(str):
+            for short_form, long_form in extract_acronyms(definition):
+                counts[short_form][long_form.lower()] += 1
+
+    # The Wikipedia list is already (abbreviation, full name)
+    if os.path.exists(wikipedia_path) and not _is_lfs_pointer(wikipedia_path):
+        df = _read_dictionary(wikipedia_path)
+        for short_form, long_form in zip(df["Keyword"].astype(str), df["Definition"].astype(str)):
+            counts[short_form.strip()][long_form.strip().lower()] += 1
+    else:
+        print(f"[INFO] Skipping {wikipedia_path} (missing or not fetched from git-lfs)")
+
+    return {short_form : [long_form for long_form, _ in expansions.most_common()] for short_form, expansions in counts.items()}
+
+def _pack_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype = np.uint32)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype = np.uint8), offsets
+
+def build_acronym_index(acronyms: dict[str, list[str]], path: str = ACRONYM_INDEX_PATH) -> str:
+    """
+    Writes the compiled lookup structure: sorted 64-bit key hashes, and all key / expansion strings packed
+    into two UTF-8 byte blobs with uint32 offsets (no Python objects per entry, so loading is a few array reads).
+    """
+    keys = sorted(acronyms, key = _hash)
+    expansions = [expansion for key in keys for expansion in acronyms[key]]
+    expansion_ranges = np.zeros(len(keys) + 1, dtype = np.uint32)
+    expansion_ranges[1:] = np.cumsum([len(acronyms[key]) for key in keys])
+    keys_blob, key_offsets = _pack_strings(keys)
+    expansions_blob, expansion_offsets = _pack_strings(expansions)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    np.savez(path,
+             hashes = np.array([_hash(key) for key in keys], dtype = np.uint64),
+             keys_blob = keys_blob,
+             key_offsets = key_offsets,
+             expansion_ranges = expansion_ranges,
+             expansions_blob = expansions_blob,
+             expansion_offsets = expansion_offsets)
+    return path
+
+class AcronymIndex:
+    """Loads the file written by build_acronym_index and expands acronyms in queries."""
+    def __init__(self, path: str = ACRONYM_INDEX_PATH):
+        with np.load(path) as data:
+            # Plain Python containers for the small per-lookup reads (faster than scalar numpy indexing)
+            self.hashes = data["hashes"]
+            self.keys_blob = data["keys_blob"].tobytes()
+            self.key_offsets = data["key_offsets"].tolist()
+            self.expansion_ranges = data["expansion_ranges"].tolist()
+            self.expansions_blob = data["expansions_blob"].tobytes()
+            self.expansion_offsets = data["expansion_offsets"].tolist()
+    # end_def
+
+    def __len__(self):
+        return len(self.hashes)
+    # end_def
+
+    def lookup(self, acronym: str) -> list[str]:
+        """Expansions of acronym (most frequent first); tries the exact spelling, then upper case."""
+        for key in (acronym, acronym.upper()):
+            # Binary search of the sorted hashes; keys sharing a hash are adjacent, so the stored keys are compared
+            # from the first match on to rule out collisions
+            key_hash = np.uint64(_hash(key))
+            i = int(np.searchsorted(self.hashes, key_hash))
+            while i < len(self.hashes) and self.hashes[i] == key_hash:
+                if self.keys_blob[self.key_offsets[i] : self.key_offsets[i + 1]].decode("utf-8") == key:
+                    start, end = self.expansion_ranges[i], self.expansion_ranges[i + 1]
+                    return [self.expansions_blob[self.expansion_offsets[j] : self.expansion_offsets[j + 1]].decode("utf-8") for j in range(start, end)]
+                i += 1
+        return []
+    # end_def
+
+    def expand_query(self, query: str, max_expansions: int = 1) -> str:
+        """'What causes AAA?' -> 'What causes AAA (abdominal aortic aneurysm)?' (the acronym is kept for sparse matching)."""
+        def replace(match):
+            expansions = self.lookup(match.group(0))[:max_expansions]
+            if not expansions:
+                return match.group(0)
+            return f"{match.group(0)} ({'; '.join(expansions)})"
+        return ACRONYM_PATTERN.sub(replace, query)
+    # end_def
+
+if __name__ == "__main__":
+    acronyms = collect_acronyms()
+    print(f"[INFO] {len(acronyms)} acronyms collected")
+    print(f"[INFO] Acronym index saved to {build_acronym_index(acronyms)}")
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Llama 3 chat template: <|start_header_id|>role<|end_header_id|>\n\ncontent<|eot_id|>
+LLAMA3_TEMPLATE_TOKENS = ("<|start_header_id|>", "<|end_header_id|>", "<|eot_id|>")
+
+# Get the answers seperately from the Prediction (decoded text with skip_special_tokens = True)
+def isolate_answer(input_string: str, role: str = "assistant", stop: str = "User:"):
+    """
+    Returns the lines after the first line equal to role, up to and including the first line containing stop
+    (or up to the end of the string), in the same format as the original LLM_RAG.py implementation.
+    Single pass over the lines and one join, so it is linear in the output length.
+    """
+    lines = input_string.split("\n")
+    start = next((i for i, line in enumerate(lines) if line == role), None)
+    if start is None or start == len(lines) - 1:
+        return None
+    end = next((i for i in range(start + 1, len(lines)) if stop in lines[i]), len(lines) - 1)
+    return "\n".join(["", *lines[start + 1 : end + 1], "", ""])
+
+def chat_template_token_ids(tokenizer, template_tokens: tuple = LLAMA3_TEMPLATE_TOKENS):
+    """(start header, end header, end of turn) token ids, or None if the tokenizer does not have them."""
+    ids = tokenizer.convert_tokens_to_ids(list(template_tokens))
+    if any(token_id is None or token_id == tokenizer.unk_token_id for token_id in ids):
+        return None
+    return tuple(ids)
+
+def segment_roles(token_ids, template_ids: tuple) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Splits one sequence of token ids into (role ids, content ids) turns using the chat template's special tokens.
+    The special-token positions are found with vectorized comparisons, so the cost is linear in the sequence length.
+    """
+    start_header_id, end_header_id, end_of_turn_id = template_ids
+    token_ids = np.asarray(token_ids)
+    header_starts = np.flatnonzero(token_ids == start_header_id)
+    header_ends = np.flatnonzero(token_ids == end_header_id)
+    turn_ends = np.flatnonzero((token_ids == end_of_turn_id) | (token_ids == start_header_id))
+
+    turns = []
+    for header_start in header_starts:
+        k = np.searchsorted(header_ends, header_start)
+        if k == len(header_ends):
+            break
+        header_end = header_ends[k]
+        k = np.searchsorted(turn_ends, header_end + 1)
+        content_end = turn_ends[k] if k < len(turn_ends) else len(token_ids)
+        turns.append((token_ids[header_start + 1 : header_end], token_ids[header_end + 1 : content_end]))
+    return turns
+
+def extract_answers(sequences, tokenizer, role: str = "assistant", template_tokens: tuple = LLAMA3_TEMPLATE_TOKENS) -> list:
+    """
+    Returns the content of the last role turn of each generated sequence (e.g. the rows of model.generate output),
+    decoded with a single batch_decode call. Falls back to isolate_answer on the decoded text when the tokenizer
+    has no chat-template special tokens.
+    """
+    template_ids = chat_template_token_ids(tokenizer, template_tokens)
+    if template_ids is None:
+        return [isolate_answer(text, role = role) for text in tokenizer.batch_decode(sequences, skip_special_tokens = True)]
+
+    role_ids = np.asarray(tokenizer.encode(role, add_special_tokens = False))
+    contents, found = [], []
+    for sequence in sequences:
+        if hasattr(sequence, "cpu"):
+            sequence = sequence.cpu().numpy()
+        answer = None
+        for turn_role, turn_content in segment_roles(sequence, template_ids):
+            if np.array_equal(turn_role, role_ids):
+                answer = turn_content
+        found.append(answer is not None)
+        contents.append(answer.tolist() if answer is not None else [])
+
+    decoded = tokenizer.batch_decode(contents, skip_special_tokens = True)
+    return [text.strip() if has_answer else None for text, has_answer in zip(decoded, found)]
@@ -0,0 +1,78 @@
+import re
+from itertools import islice
+from typing import Iterable, Iterator
+
+def _split_long_sentence(text: str, offsets: list[tuple], budget: int) -> list[tuple[str, int]]:
+    # Cut a sentence longer than the budget at token boundaries (character offsets from the fast tokenizer)
+    pieces = []
+    for start in range(0, len(offsets), budget):
+        window = offsets[start : start + budget]
+        pieces.append((text[window[0][0] : window[-1][1]], len(window)))
+    return pieces
+
+def _pack_pieces(pieces: list[tuple[str, int]], budget: int, overlap_tokens: int) -> Iterator[tuple[list[str], int]]:
+    # Greedily fill chunks up to the budget; a new chunk starts with the trailing sentences (<= overlap_tokens) of the previous one
+    current, current_tokens = [], 0
+    for text, num_tokens in pieces:
+        if current and current_tokens + num_tokens > budget:
+            yield [piece_text for piece_text, _ in current], current_tokens
+            overlap, overlap_count = [], 0
+            for piece in reversed(current):
+                if overlap_count + piece[1] > overlap_tokens or overlap_count + piece[1] + num_tokens > budget:
+                    break
+                overlap.insert(0, piece)
+                overlap_count += piece[1]
+            current, current_tokens = overlap, overlap_count
+        current.append((text, num_tokens))
+        current_tokens += num_tokens
+    if current:
+        yield [piece_text for piece_text, _ in current], current_tokens
+
+def iter_token_chunks(pages: Iterable[dict],
+                      tokenizer,
+                      max_tokens: int = 256,
+                      overlap_tokens: int = 0,
+                      pages_per_batch: int = 256) -> Iterator[dict]:
+    """
+    Packs each page's "sentences" into chunks of at most max_tokens real tokens (special tokens such as [CLS]/[SEP] included),
+    optionally repeating up to overlap_tokens tokens of trailing sentences at the start of the next chunk.
+    The sentences of pages_per_batch pages are tokenized with one batched call of a fast (Rust) tokenizer.
+    Yields one dict per chunk with the same keys as the pages_and_chunks items in Local_RAG.py; chunk_token_count is the real count.
+    """
+    budget = max_tokens - tokenizer.num_special_tokens_to_add(pair = False)
+    if overlap_tokens >= budget:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than the token budget ({budget})")
+
+    pages = iter(pages)
+    while True:
+        batch = list(islice(pages, pages_per_batch))
+        if not batch:
+            return
+
+        sentences = [sentence for page in batch for sentence in page["sentences"]]
+        encoded = tokenizer(sentences,
+                            add_special_tokens = False,
+                            return_attention_mask = False,
+                            return_token_type_ids = False,
+                            return_offsets_mapping = True) if sentences else {"input_ids" : [], "offset_mapping" : []}
+
+        position = 0
+        for page in batch:
+            pieces = []
+            for sentence in page["sentences"]:
+                input_ids = encoded["input_ids"][position]
+                if len(input_ids) > budget:
+                    pieces.extend(_split_long_sentence(sentence, encoded["offset_mapping"][position], budget))
+                elif input_ids:
+                    pieces.append((sentence, len(input_ids)))
+                position += 1
+
+            for chunk_sentences, chunk_token_count in _pack_pieces(pieces, budget, overlap_tokens):
+                # Join the sentences together into a paragraph-like structure
+                joined_sentence_chunk = " ".join(sentence.strip() for sentence in chunk_sentences).replace("  ", " ").strip()
+                joined_sentence_chunk = re.sub(r"\.([A-Z])", r". \1", joined_sentence_chunk) # ".A" => ". A" (will work for any capital letter)
+                yield {"page_number" : page["page_number"],
+                       "sentence_chunk" : joined_sentence_chunk,
+                       "chunk_char_count" : len(joined_sentence_chunk),
+                       "chunk_word_count" : len(joined_sentence_chunk.split(" ")),
+                       "chunk_token_count" : chunk_token_count}
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+# File names inside a cache directory (one directory per embedding model)
+KEYS_FILE = "keys.u64"
+VECTORS_FILE = "vectors.bin"
+INFO_FILE = "cache_info.json"
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so re-extracted but unchanged chunks hash to the same key."""
+    return re.sub(r"\s+", " ", text).strip()
+
+def text_hashes(texts: list[str]) -> np.ndarray:
+    """64-bit blake2b hash of each normalized text."""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size = 8).digest(), "little")
+                        for text in texts),
+                       dtype = np.uint64,
+                       count = len(texts))
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (embedding model name, normalized chunk text hash).
+    Vectors are appended to a flat binary file and read back through np.memmap; hashes are kept sorted in memory for lookups.
+    """
+    def __init__(self, cache_dir: str, model_name: str, dtype: str = "float32"):
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "_", model_name))
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        os.makedirs(self.cache_dir, exist_ok = True)
+
+        info_path = os.path.join(self.cache_dir, INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+            self.dim = info["dim"]
+            self.dtype = np.dtype(info["dtype"])
+
+        keys_path = os.path.join(self.cache_dir, KEYS_FILE)
+        keys = np.fromfile(keys_path, dtype = np.uint64) if os.path.exists(keys_path) else np.zeros(0, dtype = np.uint64)
+        keys = self._drop_incomplete_rows(keys)
+        # Rows are in append order; keep a sorted copy for np.searchsorted
+        self._order = np.argsort(keys, kind = "stable")
+        self._sorted_keys = keys[self._order]
+    # end_def
+
+    def _drop_incomplete_rows(self, keys: np.ndarray) -> np.ndarray:
+        """
+        An interrupted add() can leave rows in one file that are missing from the other (or a partial row). Both files are
+        cut back to the rows they have in common, otherwise every later append would pair key i with another text's vector.
+        """
+        keys_path = os.path.join(self.cache_dir, KEYS_FILE)
+        vectors_path = os.path.join(self.cache_dir, VECTORS_FILE)
+        row_bytes = (self.dim or 0) * self.dtype.itemsize
+        num_vectors = os.path.getsize(vectors_path) // row_bytes if row_bytes and os.path.exists(vectors_path) else 0
+        num_rows = min(len(keys), num_vectors)
+        if os.path.exists(keys_path) and os.path.getsize(keys_path) != num_rows * keys.itemsize:
+            os.truncate(keys_path, num_rows * keys.itemsize)
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) != num_rows * row_bytes:
+            os.truncate(vectors_path, num_rows * row_bytes)
+        return keys[:num_rows]
+    # end_def
+
+    def __len__(self):
+        return len(self._sorted_keys)
+    # end_def
+
+    def _vectors(self) -> np.memmap:
+        return np.memmap(os.path.join(self.cache_dir, VECTORS_FILE), dtype = self.dtype, mode = "r", shape = (len(self), self.dim))
+    # end_def
+
+    def lookup(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (row in the vectors file, found mask) for each key."""
+        if len(self) == 0:
+            return np.zeros(len(keys), dtype = np.int64), np.zeros(len(keys), dtype = bool)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions = np.minimum(positions, len(self) - 1)
+        found = self._sorted_keys[positions] == keys
+        return self._order[positions], found
+    # end_def
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._vectors()[rows], dtype = np.float32)
+    # end_def
+
+    def add(self, keys: np.ndarray, vectors: np.ndarray):
+        """Appends new (key, vector) pairs to the cache files."""
+        if len(keys) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype = self.dtype)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(os.path.join(self.cache_dir, INFO_FILE), "w") as f:
+                json.dump({"model_name" : self.model_name, "dim" : self.dim, "dtype" : self.dtype.name}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Cache for '{self.model_name}' holds {self.dim}-dim vectors, got {vectors.shape[1]}-dim")
+
+        # Vectors first, then keys: an interrupted append leaves trailing rows in one file only, which the next load
+        # truncates away (_drop_incomplete_rows)
+        with open(os.path.join(self.cache_dir, VECTORS_FILE), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(os.path.join(self.cache_dir, KEYS_FILE), "ab") as f:
+            f.write(np.ascontiguousarray(keys, dtype = np.uint64).tobytes())
+
+        all_keys = np.empty(len(self) + len(keys), dtype = np.uint64)
+        all_keys[self._order] = self._sorted_keys
+        all_keys[len(self):] = keys
+        self._order = np.argsort(all_keys, kind = "stable")
+        self._sorted_keys = all_keys[self._order]
+    # end_def
+
+def encode_with_cache(model, texts: list[str], cache: EmbeddingCache, batch_size: int = 128, **encode_kwargs) -> np.ndarray:
+    """
+    Returns a (len(texts), dim) float32 matrix of embeddings, encoding only the texts that are not already cached.
+    model is anything with a SentenceTransformer-style encode(texts, batch_size = ...) method.
+    """
+    if len(texts) == 0:
+        return np.zeros((0, cache.dim or 0), dtype = np.float32)
+    keys = text_hashes(texts)
+    rows, found = cache.lookup(keys)
+
+    # Encode each missing text once, even if it appears several times
+    missing_keys, first_positions = np.unique(keys[~found], return_index = True)
+    if len(missing_keys) > 0:
+        missing_texts = [texts[i] for i in np.flatnonzero(~found)[first_positions]]
+        print(f"[INFO] Embedding cache: {len(texts) - int((~found).sum())} hits, encoding {len(missing_texts)} new chunks.")
+        new_vectors = np.asarray(model.encode(missing_texts, batch_size = batch_size, **encode_kwargs), dtype = np.float32)
+        cache.add(missing_keys, new_vectors)
+        rows, found = cache.lookup(keys)
+    return cache.get(rows)
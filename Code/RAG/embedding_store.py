@@ -0,0 +1,81 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import torch
+
+# File names inside an embedding store directory
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.feather"
+INFO_FILE = "store_info.json"
+
+# Columns kept next to the embedding matrix (one row per chunk)
+METADATA_COLUMNS = ["page_number",
+                    "sentence_chunk",
+                    "chunk_char_count",
+                    "chunk_word_count",
+                    "chunk_token_count"]
+
+def save_embedding_store(pages_and_chunks: list[dict],
+                         embeddings,
+                         store_dir: str = "text_chunks_and_embeddings",
+                         dtype: str = "float32") -> str:
+    """
+    Writes chunk embeddings as a binary .npy matrix and the chunk metadata as a columnar Arrow (feather) file.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"dtype must be 'float32' or 'float16', got '{dtype}'")
+
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.detach().cpu().numpy()
+    embeddings = np.asarray(embeddings)
+    if embeddings.ndim != 2 or len(embeddings) != len(pages_and_chunks):
+        raise ValueError(f"Expected a ({len(pages_and_chunks)}, dim) embedding matrix, got shape {embeddings.shape}")
+
+    os.makedirs(store_dir, exist_ok = True)
+
+    # Write the matrix straight into a memory-mapped .npy file (no text round-trip)
+    matrix = np.lib.format.open_memmap(os.path.join(store_dir, EMBEDDINGS_FILE),
+                                       mode = "w+",
+                                       dtype = dtype,
+                                       shape = embeddings.shape)
+    matrix[:] = embeddings
+    matrix.flush()
+    del matrix
+
+    # Keep only the metadata columns (the per-chunk "embedding" column lives in the matrix)
+    df = pd.DataFrame(pages_and_chunks)
+    columns = [column for column in METADATA_COLUMNS if column in df.columns]
+    df[columns].reset_index(drop = True).to_feather(os.path.join(store_dir, METADATA_FILE))
+
+    with open(os.path.join(store_dir, INFO_FILE), "w") as f:
+        json.dump({"num_chunks" : int(embeddings.shape[0]),
+                   "embedding_dim" : int(embeddings.shape[1]),
+                   "dtype" : dtype}, f)
+    return store_dir
+
+def load_embedding_matrix(store_dir: str = "text_chunks_and_embeddings") -> np.memmap:
+    """
+    Opens the embedding matrix of a store as a copy-on-write memmap (nothing is read until it is touched).
+    """
+    # mode "c" gives a writeable view so torch.from_numpy can share the buffer without copying
+    return np.load(os.path.join(store_dir, EMBEDDINGS_FILE), mmap_mode = "c")
+
+def load_embedding_store(store_dir: str = "text_chunks_and_embeddings",
+                         device: str = "cpu") -> tuple[torch.Tensor, pd.DataFrame]:
+    """
+    Loads a store saved by save_embedding_store and returns (embeddings tensor, metadata DataFrame).
+    On CPU the tensor shares memory with the memmap; on other devices it is copied once.
+    float16 stores are upcast to float32 on load (compact on disk only), so util.dot_score can take float32 query embeddings.
+    """
+    matrix = load_embedding_matrix(store_dir)
+    embeddings = torch.from_numpy(matrix)
+    if embeddings.dtype != torch.float32:
+        embeddings = embeddings.float()
+    if device != "cpu":
+        embeddings = embeddings.to(device)
+
+    # Arrow IPC files are memory-mapped by pyarrow, so the text column is not parsed row by row
+    metadata = feather.read_table(os.path.join(store_dir, METADATA_FILE), memory_map = True).to_pandas()
+    return embeddings, metadata
@@ -0,0 +1,35 @@
+from peft import PeftModel
+from transformers import AutoModelForCausalLM
+
+def prepare_model_for_inference(model):
+    """
+    Turns a (possibly LoRA-wrapped) causal LM into a serving model:
+    LoRA weights merged into the base layers, KV cache enabled, eval mode and no gradients.
+    """
+    # Merge LoRA adapters so decoding runs plain Linear layers instead of base + adapter on every step
+    if isinstance(model, PeftModel):
+        model = model.merge_and_unload()
+
+    # Training setups turn the KV cache off (it conflicts with gradient checkpointing); generation needs it back
+    model.config.use_cache = True
+    if getattr(model, "generation_config", None) is not None:
+        model.generation_config.use_cache = True
+    if getattr(model, "is_gradient_checkpointing", False):
+        model.gradient_checkpointing_disable()
+
+    model.eval()
+    model.requires_grad_(False)
+    return model
+
+def load_model_for_inference(model_path: str,
+                             adapter_path: str = None,
+                             **from_pretrained_kwargs):
+    """
+    Loads a causal LM for generation only (no prepare_model_for_kbit_training / get_peft_model).
+    If adapter_path points to a fine-tuned LoRA checkpoint, its weights are merged into the base model.
+    Extra keyword arguments (quantization_config, torch_dtype, device_map, attn_implementation, ...) go to from_pretrained.
+    """
+    model = AutoModelForCausalLM.from_pretrained(model_path, **from_pretrained_kwargs)
+    if adapter_path is not None:
+        model = PeftModel.from_pretrained(model, adapter_path)
+    return prepare_model_for_inference(model)
@@ -0,0 +1,140 @@
+import os
+import fitz
+from multiprocessing import Pool
+from typing import Iterable, Iterator, Union
+from spacy.lang.en import English
+
+def text_formatter(text: str) -> str:
+    """Performs minor formatting on text."""
+    cleaned_text = text.replace("\n", " ").strip()
+
+    # Potentially more text formatting functions can go here
+    return cleaned_text
+
+def page_record(text: str, page_number: int, source: str) -> dict:
+    """Builds the per-page dict used throughout Local_RAG.py."""
+    return {"source" : source,
+            "page_number": page_number,
+            "page_char_count": len(text),
+            "page_word_count" : len(text.split(" ")),
+            "page_sentence_count_raw": len(text.split(". ")),
+            "page_token_count" : len(text) / 4, # 1 token = ~4 characters
+            "text" : text}
+
+def list_pdf_files(path: str) -> list[str]:
+    """Returns [path] for a single PDF or every PDF inside a directory (sorted, non-recursive)."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf"))
+    return [path]
+
+def _read_page_range(task: tuple) -> list[dict]:
+    # Each worker opens its own fitz handle (fitz documents cannot be shared across processes)
+    pdf_path, start, stop, page_offset = task
+    source = os.path.basename(pdf_path)
+    records = []
+    with fitz.open(pdf_path) as doc:
+        for page_number in range(start, stop):
+            text = text_formatter(text = doc.load_page(page_number).get_text())
+            records.append(page_record(text, page_number - page_offset, source))
+    return records
+
+def _page_range_tasks(pdf_paths: list[str], pages_per_task: int, page_offset: dict[str, int]) -> Iterator[tuple]:
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        offset = page_offset.get(os.path.basename(pdf_path), 0)
+        for start in range(0, page_count, pages_per_task):
+            yield (pdf_path, start, min(start + pages_per_task, page_count), offset)
+
+def iter_pdf_pages(path: str,
+                   num_workers: int = None,
+                   pages_per_task: int = 32,
+                   page_offset: Union[int, dict[str, int]] = 0) -> Iterator[dict]:
+    """
+    Yields one record per page for a PDF file or a directory of PDFs, in document/page order.
+    Page ranges of pages_per_task pages are read by a pool of num_workers processes (num_workers = 1 reads serially;
+    any other value starts a multiprocessing.Pool, so the caller needs an if __name__ == "__main__" guard).
+    page_offset is subtracted from the 0-based page index (e.g. 41 for the front matter of human-nutrition-text.pdf).
+    For a directory, pass a dict keyed by file name ({"human-nutrition-text.pdf" : 41}); files missing from it get 0.
+    An int is only accepted for a single PDF, since the front matter differs from one document to the next.
+    """
+    pdf_paths = list_pdf_files(path)
+    if not isinstance(page_offset, dict):
+        if page_offset and os.path.isdir(path):
+            raise ValueError("page_offset must be a dict keyed by file name when path is a directory")
+        page_offset = {os.path.basename(pdf_path) : page_offset for pdf_path in pdf_paths}
+    tasks = _page_range_tasks(pdf_paths, pages_per_task, page_offset)
+    if num_workers == 1:
+        for task in tasks:
+            yield from _read_page_range(task)
+        return
+
+    with Pool(processes = num_workers) as pool:
+        # imap keeps the original order and only holds finished page ranges until they are consumed
+        for records in pool.imap(_read_page_range, tasks):
+            yield from records
+
+def sentencizer_pipeline() -> English:
+    """Blank English pipeline with only the rule-based sentencizer (same as Local_RAG.py)."""
+    nlp = English()
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+_worker_nlp = None
+
+def _init_sentencizer_worker(nlp: English = None):
+    global _worker_nlp
+    _worker_nlp = nlp if nlp is not None else sentencizer_pipeline()
+
+def _segment_batch(texts: list[str], batch_size: int) -> list[list[str]]:
+    # Runs inside a worker: only plain strings cross the process boundary (pickling spaCy Docs back is slower than segmenting them)
+    return [[str(sentence) for sentence in doc.sents] for doc in _worker_nlp.pipe(texts, batch_size = batch_size)]
+
+def _page_batches(pages: Iterable[dict], batch_size: int) -> Iterator[list[dict]]:
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _attach_sentences(batch: list[dict], result) -> Iterator[dict]:
+    for page, sentences in zip(batch, result.get()):
+        page["sentences"] = sentences
+        page["page_sentence_count_spacy"] = len(sentences)
+        yield page
+
+def iter_page_sentences(pages: Iterable[dict],
+                        nlp: English = None,
+                        batch_size: int = 64,
+                        n_process: int = 1) -> Iterator[dict]:
+    """
+    Streams page records through nlp.pipe and yields each one, in order, with "sentences" (list[str])
+    and "page_sentence_count_spacy" added as soon as its batch is segmented.
+    With n_process > 1, batches of batch_size pages are segmented by a pool of workers, each running a pickled copy of
+    nlp (a sentencizer-only pipeline when nlp is None); the caller needs an if __name__ == "__main__" guard then.
+    """
+    if n_process == 1:
+        if nlp is None:
+            nlp = sentencizer_pipeline()
+        # as_tuples carries each page dict alongside its text through the pipe
+        texts_and_pages = ((page["text"], page) for page in pages)
+        for doc, page in nlp.pipe(texts_and_pages, as_tuples = True, batch_size = batch_size):
+            page["sentences"] = [str(sentence) for sentence in doc.sents]
+            page["page_sentence_count_spacy"] = len(page["sentences"])
+            yield page
+        return
+
+    # Page dicts stay in this process; workers only receive the texts of each batch
+    with Pool(processes = n_process, initializer = _init_sentencizer_worker, initargs = (nlp,)) as pool:
+        batches = _page_batches(pages, batch_size)
+        pending = []
+        for batch in batches:
+            pending.append((batch, pool.apply_async(_segment_batch, ([page["text"] for page in batch], batch_size))))
+            # Keep at most 2 batches per worker in flight so memory stays bounded
+            while len(pending) > 2 * n_process:
+                yield from _attach_sentences(*pending.pop(0))
+        for batch, result in pending:
+            yield from _attach_sentences(batch, result)
@@ -0,0 +1,122 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import tempfile
+import faiss
+from langchain_core.embeddings import Embeddings
+from langchain_community.document_loaders import CSVLoader
+from langchain_community.vectorstores import FAISS
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from Code.RAG.embedding_cache import EmbeddingCache, encode_with_cache
+from Code.RAG.sparse_index import BM25Index, INDEX_FILES
+from Code.utils import file_fingerprint
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a langchain Embeddings model (e.g. HuggingFaceEmbeddings) with the persistent EmbeddingCache,
+    so FAISS.from_documents only embeds chunks that were not embedded on a previous run.
+    """
+    def __init__(self, embeddings: Embeddings, cache_dir: str = "embedding_cache", model_name: str = None):
+        self.embeddings = embeddings
+        if model_name is None:
+            model_name = os.path.basename(os.path.normpath(embeddings.model_name))
+        self.model_name = model_name
+        self.cache = EmbeddingCache(cache_dir = cache_dir, model_name = model_name)
+    # end_def
+
+    def encode(self, texts: list[str], batch_size: int = 128):
+        # Called by encode_with_cache for cache misses only
+        return self.embeddings.embed_documents(texts)
+    # end_def
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return encode_with_cache(self, texts, self.cache).tolist()
+    # end_def
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+    # end_def
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # Batched query embedding; queries are not written to the chunk cache
+        return self.embeddings.embed_documents(texts)
+    # end_def
+
+def faiss_index_key(csv_path: str, embedding_name: str, chunk_size: int, chunk_overlap: int) -> str:
+    """Key of a persisted FAISS index: changes whenever the CSV, the splitter parameters or the embedding model change."""
+    params = json.dumps({"csv" : file_fingerprint(csv_path),
+                         "embedding" : embedding_name,
+                         "chunk_size" : chunk_size,
+                         "chunk_overlap" : chunk_overlap}, sort_keys = True)
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+
+def faiss_index_folder(csv_path: str,
+                       embeddings: Embeddings,
+                       index_dir: str = "faiss_index",
+                       chunk_size: int = 500,
+                       chunk_overlap: int = 100,
+                       embedding_name: str = None) -> str:
+    """Folder of the persisted FAISS index for these settings (other indexes over the same splits can be stored inside it)."""
+    if embedding_name is None:
+        embedding_name = os.path.basename(os.path.normpath(getattr(embeddings, "model_name", type(embeddings).__name__)))
+    return os.path.join(index_dir, faiss_index_key(csv_path, embedding_name, chunk_size, chunk_overlap))
+
+def load_faiss_index(folder: str, embeddings: Embeddings) -> FAISS:
+    """
+    Warm start: memory-maps the faiss index written by FAISS.save_local and unpickles its docstore.
+    """
+    index = faiss.read_index(os.path.join(folder, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    # index.pkl is our own file written by FAISS.save_local in build_or_load_faiss_index
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embedding_function = embeddings,
+                 index = index,
+                 docstore = docstore,
+                 index_to_docstore_id = index_to_docstore_id)
+
+def build_or_load_faiss_index(csv_path: str,
+                              embeddings: Embeddings,
+                              index_dir: str = "faiss_index",
+                              chunk_size: int = 500,
+                              chunk_overlap: int = 100,
+                              embedding_name: str = None) -> FAISS:
+    """
+    Returns the FAISS store of csv_path split with RecursiveCharacterTextSplitter(chunk_size, chunk_overlap).
+    The store is built once and saved under index_dir/<key>; later calls with the same CSV content,
+    splitter parameters and embedding model memory-map it instead of re-splitting and re-embedding.
+    """
+    folder = faiss_index_folder(csv_path, embeddings, index_dir, chunk_size, chunk_overlap, embedding_name)
+
+    if all(os.path.exists(os.path.join(folder, name)) for name in ("index.faiss", "index.pkl")):
+        print(f"[INFO] Loading FAISS index from {folder}")
+        return load_faiss_index(folder, embeddings)
+
+    print(f"[INFO] No FAISS index for the current CSV/splitter settings, building {folder}")
+    documents = CSVLoader(csv_path).load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size = chunk_size, chunk_overlap = chunk_overlap, add_start_index = True)
+    all_splits = splitter.split_documents(documents)
+    db = FAISS.from_documents(all_splits, embeddings)
+    # Saved to a temporary directory and renamed, so an interrupted save never leaves an index.faiss without its index.pkl
+    os.makedirs(index_dir, exist_ok = True)
+    temp_path = tempfile.mkdtemp(dir = index_dir)
+    db.save_local(temp_path)
+    # Leftovers of an incomplete index (e.g. from before saves were atomic) would block the rename
+    shutil.rmtree(folder, ignore_errors = True)
+    os.replace(temp_path, folder)
+    return db
+
+def build_or_load_bm25_index(db: FAISS, folder: str) -> BM25Index:
+    """
+    BM25 index over the documents of a FAISS store, in faiss row order, saved in folder/bm25 (next to index.faiss).
+    """
+    bm25_dir = os.path.join(folder, "bm25")
+    # Indexes saved before the forward index and bitmaps existed lack some of the files: those are rebuilt
+    if all(os.path.exists(os.path.join(bm25_dir, name)) for name in INDEX_FILES):
+        return BM25Index.load(bm25_dir)
+    texts = [db.docstore.search(db.index_to_docstore_id[i]).page_content for i in range(db.index.ntotal)]
+    sparse_index = BM25Index().build(texts)
+    sparse_index.save(bm25_dir)
+    return sparse_index
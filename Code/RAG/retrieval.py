@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from Code.RAG.vector_index import topk_dot_scores
+from Code.RAG.sparse_index import BM25Index
+
+def retrieve_batch(queries: list[str],
+                   embeddings: torch.tensor,
+                   model: SentenceTransformer,
+                   k: int = 5,
+                   index = None,
+                   batch_size: int = 64,
+                   corpus_chunk_size: int = None) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Embeds all queries with one model.encode call and returns (Q, k) top-k scores and indices.
+    Scores come from a single (optionally corpus-chunked) matrix multiply, or from index.search if an index is given.
+    """
+    query_embeddings = model.encode(queries,
+                                    batch_size = batch_size,
+                                    convert_to_tensor = True)
+    if index is not None:
+        return index.search(query_embeddings, k = k)
+    return topk_dot_scores(query_embeddings, embeddings, k = k, corpus_chunk_size = corpus_chunk_size)
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int = 5, rrf_k: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fuses several (Q, n) rankings of document indices (-1 = padding) with reciprocal rank fusion:
+    score(d) = sum over rankings of 1 / (rrf_k + rank of d). Returns (Q, k) fused scores and indices (padded with 0 / -1).
+    """
+    num_queries = len(rankings[0])
+    fused_scores = np.zeros((num_queries, k), dtype = np.float32)
+    fused_indices = np.full((num_queries, k), -1, dtype = np.int64)
+    for q in range(num_queries):
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking[q]):
+                if doc_id >= 0:
+                    scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (rrf_k + rank + 1)
+        top = sorted(scores.items(), key = lambda item: -item[1])[:k]
+        for i, (doc_id, score) in enumerate(top):
+            fused_indices[q, i] = doc_id
+            fused_scores[q, i] = score
+    return fused_scores, fused_indices
+
+def hybrid_retrieve_batch(queries: list[str],
+                          embeddings: torch.tensor,
+                          model: SentenceTransformer,
+                          sparse_index: BM25Index,
+                          k: int = 5,
+                          num_candidates: int = 50,
+                          index = None,
+                          rrf_k: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Dense (retrieve_batch) + sparse BM25 retrieval for a batch of queries, fused with reciprocal rank fusion.
+    Each retriever contributes its top num_candidates chunks; returns (Q, k) fused scores and chunk indices.
+    """
+    _, dense_indices = retrieve_batch(queries, embeddings, model, k = num_candidates, index = index)
+    _, sparse_indices = sparse_index.search_batch(queries, k = num_candidates)
+    return reciprocal_rank_fusion([dense_indices.cpu().numpy(), sparse_indices], k = k, rrf_k = rrf_k)
@@ -0,0 +1,163 @@
+import copy
+import json
+import asyncio
+import torch
+from time import perf_counter as timer
+from typing import Callable
+
+class MicroBatchingServer:
+    """
+    Queues incoming questions and answers them in dynamic batches:
+    a batch closes when max_batch_size questions are waiting or max_wait_ms after its first question arrived.
+    Each batch is retrieved for in one retrieve_fn call, then split into length buckets (prompt tokens // bucket_width)
+    that are generated together with left padding. Every caller gets its own answer back.
+
+    retrieve_fn(questions) -> list of context strings, build_prompt_fn(question, context) -> prompt string.
+    """
+    def __init__(self,
+                 model,
+                 tokenizer,
+                 retrieve_fn: Callable[[list[str]], list[str]],
+                 build_prompt_fn: Callable[[str, str], str],
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 50.0,
+                 bucket_width: int = 128,
+                 max_new_tokens: int = 500):
+        self.model = model
+        # A private copy: the padding settings below must not change the caller's tokenizer
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.retrieve_fn = retrieve_fn
+        self.build_prompt_fn = build_prompt_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.bucket_width = bucket_width
+        self.max_new_tokens = max_new_tokens
+        # Decoder-only models must be left-padded for batched generation
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.queue = asyncio.Queue()
+    # end_def
+
+    async def predict(self, question: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((question, future))
+        return await future
+    # end_def
+
+    async def _collect_batch(self) -> list[tuple]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    # end_def
+
+    async def run(self):
+        """Batching loop; generation runs in a worker thread so the event loop keeps accepting requests."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            questions = [question for question, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.answer_batch, questions)
+            except Exception:
+                # Answer the questions one by one, so only the failing ones get an error
+                results = []
+                for question in questions:
+                    try:
+                        results.extend(await loop.run_in_executor(None, self.answer_batch, [question]))
+                    except Exception as error:
+                        results.append(error)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+    # end_def
+
+    def answer_batch(self, questions: list[str]) -> list[str]:
+        contexts = self.retrieve_fn(questions)
+        prompts = [self.build_prompt_fn(question, context) for question, context in zip(questions, contexts)]
+
+        # Group prompts of similar token length so little of each generation batch is padding
+        lengths = [len(input_ids) for input_ids in self.tokenizer(prompts, add_special_tokens = False)["input_ids"]]
+        buckets = {}
+        for i in sorted(range(len(prompts)), key = lengths.__getitem__):
+            buckets.setdefault(lengths[i] // self.bucket_width, []).append(i)
+
+        answers = [None] * len(prompts)
+        for indices in buckets.values():
+            for i, answer in zip(indices, self._generate([prompts[i] for i in indices])):
+                answers[i] = answer
+        return answers
+    # end_def
+
+    def _generate(self, prompts: list[str]) -> list[str]:
+        inputs = self.tokenizer(prompts, add_special_tokens = False, padding = True, return_tensors = "pt").to(self.model.device)
+        with torch.inference_mode():
+            outputs = self.model.generate(**inputs,
+                                          max_new_tokens = self.max_new_tokens,
+                                          pad_token_id = self.tokenizer.pad_token_id)
+        # Only decode the newly generated tokens
+        return self.tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens = True)
+    # end_def
+
+async def _read_http_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, body
+
+async def serve_http(server: MicroBatchingServer, host: str = "127.0.0.1", port: int = 8000):
+    """
+    Minimal HTTP interface: POST /predict with {"question": "..."} returns {"answer": "...", "latency_ms": ...}.
+    """
+    async def handle(reader, writer):
+        start_time = timer()
+        try:
+            method, path, body = await _read_http_request(reader)
+            if method != "POST" or path != "/predict":
+                status, payload = "404 Not Found", {"error" : "use POST /predict"}
+            else:
+                question = json.loads(body)["question"]
+                # Rejected here, before it is queued: a bad question must not fail the rest of its batch
+                if not isinstance(question, str):
+                    raise TypeError(f"question must be a string, not {type(question).__name__}")
+                try:
+                    answer = await server.predict(question)
+                    status, payload = "200 OK", {"answer" : answer, "latency_ms" : 1000 * (timer() - start_time)}
+                except Exception as error:
+                    status, payload = "500 Internal Server Error", {"error" : str(error)}
+        # TypeError: a JSON body that is not an object (e.g. a list or a string)
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError) as error:
+            status, payload = "400 Bad Request", {"error" : str(error)}
+
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+        writer.close()
+
+    batching_task = asyncio.create_task(server.run())
+    http_server = await asyncio.start_server(handle, host, port)
+    print(f"[INFO] Serving POST http://{host}:{port}/predict")
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        batching_task.cancel()
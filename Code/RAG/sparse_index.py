@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from array import array
+from collections import Counter
+
+# File names inside a sparse index directory
+TERMS_FILE = "terms.txt"
+OFFSETS_FILE = "offsets.npy"
+DOC_IDS_FILE = "doc_ids.npy"
+IMPACTS_FILE = "impacts.npy"
+DOC_OFFSETS_FILE = "doc_offsets.npy"
+DOC_TERMS_FILE = "doc_terms.npy"
+DOC_IMPACTS_FILE = "doc_impacts.npy"
+BITMAP_ROWS_FILE = "bitmap_rows.npy"
+BITMAPS_FILE = "bitmaps.npy"
+HIGH_BITMAPS_FILE = "high_bitmaps.npy"
+HIGH_ENDS_FILE = "high_ends.npy"
+INFO_FILE = "bm25_info.json"
+INDEX_FILES = [TERMS_FILE, OFFSETS_FILE, DOC_IDS_FILE, IMPACTS_FILE, DOC_OFFSETS_FILE, DOC_TERMS_FILE, DOC_IMPACTS_FILE,
+               BITMAP_ROWS_FILE, BITMAPS_FILE, HIGH_BITMAPS_FILE, HIGH_ENDS_FILE, INFO_FILE]
+
+# Terms found in more than 1/BITMAP_DF_RATIO of the documents also get two document bitmaps (N/8 bytes each). Their
+# posting lists are never read by a query, which leaves only short lists for the accumulator.
+BITMAP_DF_RATIO = 256
+
+# Keeps acronyms and gene/protein names such as "BRCA1", "GSK-3beta" or "IL-6/STAT3" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens; compound tokens are also indexed by their parts ("gsk-3beta" -> "gsk-3beta", "gsk", "3beta")."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-/.]", token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+            # "gsk-3beta" should also match the spelling "gsk3beta"
+            tokens.append("".join(parts))
+    return tokens
+
+def _bitmap_docs(words: np.ndarray) -> np.ndarray:
+    """Document ids of the set bits of a uint64 bitmap (document d is bit d % 64 of word d // 64)."""
+    nonzero = np.flatnonzero(words)
+    bits = np.unpackbits(words[nonzero].view(np.uint8), bitorder = "little").reshape(len(nonzero), 64)
+    rows, columns = np.nonzero(bits)
+    return nonzero[rows] * 64 + columns
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index stored as flat arrays (CSR layout):
+    the postings of term t are doc_ids[offsets[t] : offsets[t + 1]] with their precomputed BM25 impact scores
+    (sorted by impact, so the first and last impacts bound the term's contribution to any document), and a forward index
+    holds the (term, impact) pairs of document d at doc_offsets[d] : doc_offsets[d + 1]. Frequent terms also have a
+    bitmap of their documents, bitmaps[bitmap_rows[t]], and one of the documents in the upper half of their impact range,
+    high_bitmaps[bitmap_rows[t]] (the postings before high_ends[bitmap_rows[t]]), so that queries never read their long
+    posting lists.
+    Arrays are saved as .npy files and memory-mapped on load.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.offsets = None
+        self.doc_ids = None
+        self.impacts = None
+        self.doc_offsets = None
+        self.doc_terms = None
+        self.doc_impacts = None
+        self.bitmap_rows = None
+        self.bitmaps = None
+        self.high_bitmaps = None
+        self.high_ends = None
+        self.num_docs = 0
+        # Per-thread dense score accumulator, reused across queries (zeroed again after each query)
+        self._local = threading.local()
+    # end_def
+
+    def build(self, texts: list[str]):
+        # Per-document term counts go into compact typed arrays (4 bytes per posting) instead of Python lists
+        term_ids, term_freqs = array("i"), array("i")
+        doc_lengths = np.zeros(len(texts), dtype = np.int64)
+        unique_terms = np.zeros(len(texts), dtype = np.int64)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            counts = Counter(self.vocab.setdefault(token, len(self.vocab)) for token in tokens)
+            doc_lengths[doc_id] = len(tokens)
+            unique_terms[doc_id] = len(counts)
+            term_ids.extend(counts.keys())
+            term_freqs.extend(counts.values())
+        terms = np.frombuffer(term_ids, dtype = np.int32)
+        tf = np.frombuffer(term_freqs, dtype = np.int32).astype(np.float32)
+        docs = np.repeat(np.arange(len(texts), dtype = np.int32), unique_terms)
+
+        self.num_docs = len(texts)
+        df = np.bincount(terms, minlength = len(self.vocab))
+        idf = np.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+        avg_length = max(doc_lengths.mean(), 1) if len(texts) else 1
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / avg_length)
+        impacts = (idf[terms] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+        # The postings are already in document order: that is the forward index
+        self.doc_offsets = np.concatenate([[0], np.cumsum(unique_terms)]).astype(np.int64)
+        self.doc_terms = terms.copy()
+        self.doc_impacts = impacts
+
+        # Group postings by term, highest impact first within a term
+        order = np.lexsort((-impacts, terms))
+        self.impacts = impacts[order]
+        self.doc_ids = docs[order]
+        self.offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        frequent = np.flatnonzero(df > self.num_docs // BITMAP_DF_RATIO)
+        self.bitmap_rows = np.full(len(self.vocab), -1, dtype = np.int32)
+        self.bitmap_rows[frequent] = np.arange(len(frequent))
+        self.bitmaps = np.zeros((len(frequent), (self.num_docs + 63) // 64), dtype = np.uint64)
+        self.high_bitmaps = np.zeros_like(self.bitmaps)
+        self.high_ends = np.zeros(len(frequent), dtype = np.int64)
+        bits = np.zeros(self.bitmaps.shape[1] * 64, dtype = bool)
+        for row, t in enumerate(frequent):
+            start, end = self.offsets[t], self.offsets[t + 1]
+            middle = (self.impacts[start] + self.impacts[end - 1]) / 2
+            # Impacts are in decreasing order: the high postings are the ones before the first impact at or below the middle
+            self.high_ends[row] = start + np.count_nonzero(self.impacts[start : end] > middle)
+            for bitmaps, stop in ((self.bitmaps, end), (self.high_bitmaps, self.high_ends[row])):
+                bits[:] = False
+                bits[self.doc_ids[start : stop]] = True
+                bitmaps[row] = np.packbits(bits, bitorder = "little").view(np.uint64)
+        return self
+    # end_def
+
+    def save(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok = True)
+        terms = sorted(self.vocab, key = self.vocab.get)
+        with open(os.path.join(index_dir, TERMS_FILE), "w", encoding = "utf-8") as f:
+            f.write("\n".join(terms))
+        np.save(os.path.join(index_dir, OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(index_dir, DOC_IDS_FILE), self.doc_ids)
+        np.save(os.path.join(index_dir, IMPACTS_FILE), self.impacts)
+        np.save(os.path.join(index_dir, DOC_OFFSETS_FILE), self.doc_offsets)
+        np.save(os.path.join(index_dir, DOC_TERMS_FILE), self.doc_terms)
+        np.save(os.path.join(index_dir, DOC_IMPACTS_FILE), self.doc_impacts)
+        np.save(os.path.join(index_dir, BITMAP_ROWS_FILE), self.bitmap_rows)
+        np.save(os.path.join(index_dir, BITMAPS_FILE), self.bitmaps)
+        np.save(os.path.join(index_dir, HIGH_BITMAPS_FILE), self.high_bitmaps)
+        np.save(os.path.join(index_dir, HIGH_ENDS_FILE), self.high_ends)
+        # Written last: an index directory is complete once its info file exists
+        with open(os.path.join(index_dir, INFO_FILE), "w") as f:
+            json.dump({"k1" : self.k1, "b" : self.b, "num_docs" : self.num_docs, "num_terms" : len(terms)}, f)
+    # end_def
+
+    @classmethod
+    def load(cls, index_dir: str):
+        with open(os.path.join(index_dir, INFO_FILE)) as f:
+            info = json.load(f)
+        index = cls(k1 = info["k1"], b = info["b"])
+        index.num_docs = info["num_docs"]
+        with open(os.path.join(index_dir, TERMS_FILE), encoding = "utf-8") as f:
+            terms = f.read().split("\n") if info["num_terms"] else []
+        index.vocab = dict(zip(terms, range(len(terms))))
+        # Plain ndarray views of the memmaps: the many small slices of a query skip np.memmap's per-slice bookkeeping
+        index.offsets = np.asarray(np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode = "r"))
+        index.doc_ids = np.asarray(np.load(os.path.join(index_dir, DOC_IDS_FILE), mmap_mode = "r"))
+        index.impacts = np.asarray(np.load(os.path.join(index_dir, IMPACTS_FILE), mmap_mode = "r"))
+        index.doc_offsets = np.asarray(np.load(os.path.join(index_dir, DOC_OFFSETS_FILE), mmap_mode = "r"))
+        index.doc_terms = np.asarray(np.load(os.path.join(index_dir, DOC_TERMS_FILE), mmap_mode = "r"))
+        index.doc_impacts = np.asarray(np.load(os.path.join(index_dir, DOC_IMPACTS_FILE), mmap_mode = "r"))
+        index.bitmap_rows = np.asarray(np.load(os.path.join(index_dir, BITMAP_ROWS_FILE), mmap_mode = "r"))
+        index.bitmaps = np.asarray(np.load(os.path.join(index_dir, BITMAPS_FILE), mmap_mode = "r"))
+        index.high_bitmaps = np.asarray(np.load(os.path.join(index_dir, HIGH_BITMAPS_FILE), mmap_mode = "r"))
+        index.high_ends = np.asarray(np.load(os.path.join(index_dir, HIGH_ENDS_FILE), mmap_mode = "r"))
+        return index
+    # end_def
+
+    def _accumulator(self) -> np.ndarray:
+        scores = getattr(self._local, "scores", None)
+        if scores is None or len(scores) != self.num_docs:
+            scores = self._local.scores = np.zeros(self.num_docs, dtype = np.float32)
+        return scores
+    # end_def
+
+    def _exact_scores(self, docs: np.ndarray, term_ids: np.ndarray) -> np.ndarray:
+        # BM25 scores of a few documents for a few terms, summed from their forward index rows
+        starts, ends = self.doc_offsets[docs], self.doc_offsets[docs + 1]
+        lengths = ends - starts
+        rows = np.repeat(np.arange(len(docs)), lengths)
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        terms = self.doc_terms[positions]
+        found = np.zeros(len(terms), dtype = bool)
+        for t in term_ids:
+            found |= terms == t
+        weights = self.doc_impacts[positions] * found
+        return np.bincount(rows, weights = weights, minlength = len(docs))
+    # end_def
+
+    @staticmethod
+    def _frequent_only_docs(bands: list[list[tuple]], upper: np.ndarray, threshold: float) -> np.ndarray:
+        # Documents whose frequent-term upper bounds can sum to threshold or more. bands[j] lists the (bitmap, upper bound)
+        # pairs of term j, widest band first and each within the one before, upper[j] its highest bound (terms sorted by
+        # it, decreasing). Only the minimal sets of terms that reach threshold are intersected: adding terms to a set
+        # cannot add documents.
+        suffix = np.append(np.cumsum(upper[::-1])[::-1], 0)
+        union = np.zeros(len(bands[0][0][0]), dtype = np.uint64)
+
+        def visit(start, total, words):
+            for j in range(start, len(bands)):
+                if total + suffix[j] < threshold:
+                    return
+                common = words
+                for bitmap, bound in bands[j]:
+                    common = bitmap if common is None else common & bitmap
+                    if total + bound >= threshold:
+                        # The narrower bands are subsets of this one
+                        np.bitwise_or(union, common, out = union)
+                        break
+                    if total + bound + suffix[j + 1] >= threshold:
+                        if not common.any():
+                            break
+                        visit(j + 1, total + bound, common)
+
+        visit(0, 0.0, None)
+        return _bitmap_docs(union)
+    # end_def
+
+    def search(self, query: str, k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k (scores, doc ids) of one query; fewer than k if fewer documents match.
+        MaxScore-style thresholding: only the posting lists of rare terms are read, into a dense float32 accumulator.
+        Frequent terms are bounded per document by the impact band their bitmaps put it in, and the documents with
+        frequent terms only are enumerated from bitmap intersections just while their upper bounds can still reach the
+        k-th best lower bound. The few documents whose upper bound reaches it are scored exactly from the forward index.
+        """
+        term_ids = np.array(sorted({self.vocab[token] for token in tokenize(query) if token in self.vocab}), dtype = np.int64)
+        if k <= 0 or not len(term_ids):
+            return np.zeros(0, dtype = np.float32), np.zeros(0, dtype = np.int64)
+        frequent = term_ids[self.bitmap_rows[term_ids] >= 0]
+        rows = self.bitmap_rows[frequent]
+        upper = self.impacts[self.offsets[frequent]].astype(np.float64)
+        order = np.argsort(-upper, kind = "stable")
+        frequent, rows, upper = frequent[order], rows[order], upper[order]
+        # Each frequent term has a low band of impacts [lower, low_upper] and a high band [high_lower, upper]
+        lower = self.impacts[self.offsets[frequent + 1] - 1].astype(np.float64)
+        low_upper = self.impacts[self.high_ends[rows]].astype(np.float64)
+        high_lower = np.where(self.high_ends[rows] > self.offsets[frequent], self.impacts[self.high_ends[rows] - 1], upper)
+        bands = [[(self.bitmaps[row], low_upper[j]), (self.high_bitmaps[row], upper[j])] if self.high_ends[row] > self.offsets[t]
+                 else [(self.bitmaps[row], upper[j])] for j, (t, row) in enumerate(zip(frequent, rows))]
+        # Bounds added per band code (0: term absent, 1: low band, 2: high band), the upper ones on top of upper.sum()
+        low_steps = np.stack([np.zeros_like(lower), lower, high_lower], axis = 1)
+        high_steps = np.stack([-upper, low_upper - upper, np.zeros_like(upper)], axis = 1)
+
+        def bounds(docs, theta):
+            # Score bounds of the docs that can reach theta: their accumulated rare-term scores plus the impact band of
+            # each frequent term they contain. The k-th best lower bound raises theta as the terms are added, and the
+            # docs whose upper bound falls below it are dropped on the way (so they cannot be in the top k).
+            low = scores[docs].astype(np.float64)
+            high = low + upper.sum()
+            words, bits = docs >> 6, (docs & 63).astype(np.uint64)
+            for j, row in enumerate(rows):
+                keep = high >= theta * (1 - 1e-4)
+                if not keep.all():
+                    docs, low, high, words, bits = docs[keep], low[keep], high[keep], words[keep], bits[keep]
+                codes = ((self.bitmaps[row][words] >> bits) & 1) + ((self.high_bitmaps[row][words] >> bits) & 1)
+                low += low_steps[j][codes]
+                high += high_steps[j][codes]
+                theta = max(theta, kth_largest(low[low > theta]))
+            return docs, low, high, theta
+
+        def kth_largest(values):
+            return np.partition(values, -k)[-k] if len(values) >= k else 0.0
+
+        scores = self._accumulator()
+        touched = []
+        try:
+            for t in term_ids[self.bitmap_rows[term_ids] < 0]:
+                docs = self.doc_ids[self.offsets[t] : self.offsets[t + 1]]
+                # Impacts are positive and a list holds each document once, so a zero score marks a first visit
+                touched.append(docs[scores[docs] == 0] if touched else docs)
+                scores[docs] += self.impacts[self.offsets[t] : self.offsets[t + 1]]
+            candidates = np.concatenate(touched).astype(np.int64) if touched else np.zeros(0, dtype = np.int64)
+            # The rare-term scores alone already give a lower bound of the k-th score
+            candidates, low, high, theta = bounds(candidates, kth_largest(scores[candidates]))
+
+            # Documents with frequent terms only: lower the threshold until the k-th best lower bound reaches it (every
+            # document left out is then below the top k); at the smallest band bound every such document is included.
+            # The first threshold is theta when the rare-term documents already set a high one.
+            if len(frequent) and upper.sum() >= theta:
+                smallest = min(term_bands[0][1] for term_bands in bands)
+                threshold = max(theta, smallest, upper.sum() / 2)
+                while True:
+                    docs = self._frequent_only_docs(bands, upper, threshold * (1 - 1e-4))
+                    docs = docs[scores[docs] == 0]
+                    docs, docs_low, docs_high, theta = bounds(docs, theta)
+                    theta = max(theta, kth_largest(np.concatenate([low, docs_low])))
+                    if theta >= threshold or threshold <= smallest:
+                        break
+                    threshold = max(theta, smallest, 0.75 * threshold)
+                candidates = np.concatenate([candidates, docs])
+                low, high = np.concatenate([low, docs_low]), np.concatenate([high, docs_high])
+
+            # Slightly below theta, for the float32 rounding of the accumulator. Documents without frequent terms (or
+            # whose frequent terms have a single impact) already have their exact score as both bounds.
+            keep = high >= theta * (1 - 1e-4)
+            candidates, exact, high = candidates[keep], low[keep], high[keep]
+            loose = high > exact
+            exact[loose] = scores[candidates[loose]] + self._exact_scores(candidates[loose], frequent)
+        finally:
+            if touched:
+                scores[np.concatenate(touched)] = 0
+
+        top = np.lexsort((candidates, -exact))[:k]
+        return exact[top].astype(np.float32), candidates[top].astype(np.int64)
+    # end_def
+
+    def search_batch(self, queries: list[str], k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """(Q, k) scores and doc ids; rows with fewer than k matches are padded with score 0 and id -1."""
+        scores = np.zeros((len(queries), k), dtype = np.float32)
+        indices = np.full((len(queries), k), -1, dtype = np.int64)
+        for i, query in enumerate(queries):
+            query_scores, query_indices = self.search(query, k = k)
+            scores[i, : len(query_scores)] = query_scores
+            indices[i, : len(query_indices)] = query_indices
+        return scores, indices
+    # end_def
@@ -0,0 +1,234 @@
+import os
+import json
+from abc import ABC, abstractmethod
+import numpy as np
+import torch
+from time import perf_counter as timer
+
+from Code.RAG.embedding_store import load_embedding_matrix
+
+# File names written next to the embedding store
+INDEX_FILE = "index.faiss"
+INDEX_INFO_FILE = "index_info.json"
+
+def _as_numpy(embeddings) -> np.ndarray:
+    """Returns a C-contiguous float32 matrix (faiss only accepts float32)."""
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.detach().float().cpu().numpy()
+    embeddings = np.asarray(embeddings, dtype = np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings[None, :]
+    return np.ascontiguousarray(embeddings)
+
+def topk_dot_scores(query_embeddings, embeddings, k: int = 5, corpus_chunk_size: int = None) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Scores a (Q, dim) query matrix against every embedding with one matrix multiply and returns (Q, k) scores and indices.
+    With corpus_chunk_size the corpus is scored block by block and only a running top-k is kept, so the (Q, N) score matrix never has to fit in memory.
+    """
+    query_embeddings = torch.as_tensor(query_embeddings).to(embeddings.device, embeddings.dtype)
+    if query_embeddings.dim() == 1:
+        query_embeddings = query_embeddings.unsqueeze(0)
+    k = min(k, len(embeddings))
+
+    if corpus_chunk_size is None or len(embeddings) <= corpus_chunk_size:
+        return torch.topk(query_embeddings @ embeddings.T, k = k, dim = 1)
+
+    best_scores, best_indices = None, None
+    for start in range(0, len(embeddings), corpus_chunk_size):
+        block = torch.as_tensor(embeddings[start : start + corpus_chunk_size]).to(query_embeddings.device)
+        scores, indices = torch.topk(query_embeddings @ block.T, k = min(k, len(block)), dim = 1)
+        indices += start
+        if best_scores is not None:
+            # Merge the block's top-k with the running top-k
+            scores = torch.cat([best_scores, scores], dim = 1)
+            indices = torch.cat([best_indices, indices], dim = 1)
+            # Blocks smaller than k leave fewer than k columns to merge at first
+            scores, order = torch.topk(scores, k = min(k, scores.shape[1]), dim = 1)
+            indices = torch.gather(indices, 1, order)
+        best_scores, best_indices = scores, indices
+    return best_scores, best_indices
+
+class FlatIndex:
+    """Exact inner-product search over every embedding (the original util.dot_score + torch.topk path)."""
+    kind = "flat"
+
+    def __init__(self, embeddings = None):
+        self.params = {}
+        self.embeddings = None
+        if embeddings is not None:
+            self.build(embeddings)
+    # end_def
+
+    def build(self, embeddings):
+        if not isinstance(embeddings, torch.Tensor):
+            embeddings = torch.from_numpy(np.asarray(embeddings))
+        self.embeddings = embeddings
+        return self
+    # end_def
+
+    def search(self, query_embeddings, k: int = 5) -> tuple[torch.Tensor, torch.Tensor]:
+        return topk_dot_scores(query_embeddings, self.embeddings, k = k)
+    # end_def
+
+    def save(self, store_dir: str):
+        # Nothing to write: the flat index is the embedding matrix itself
+        pass
+    # end_def
+
+    def load(self, store_dir: str, params: dict):
+        return self.build(load_embedding_matrix(store_dir))
+    # end_def
+
+    def __len__(self):
+        return 0 if self.embeddings is None else len(self.embeddings)
+    # end_def
+
+class FaissIndex(ABC):
+    """Base class for the approximate faiss backends (inner-product metric); subclasses implement _create."""
+    kind = None
+
+    def __init__(self, **params):
+        self.params = params
+        self.index = None
+    # end_def
+
+    @abstractmethod
+    def _create(self, dim: int):
+        """Returns an empty faiss index of dimension dim (trained by build when it needs training)."""
+    # end_def
+
+    def build(self, embeddings):
+        embeddings = _as_numpy(embeddings)
+        self.index = self._create(embeddings.shape[1])
+        if not self.index.is_trained:
+            self.index.train(embeddings)
+        self.index.add(embeddings)
+        self._set_search_params()
+        return self
+    # end_def
+
+    def _set_search_params(self):
+        pass
+    # end_def
+
+    def search(self, query_embeddings, k: int = 5) -> tuple[torch.Tensor, torch.Tensor]:
+        scores, indices = self.index.search(_as_numpy(query_embeddings), min(k, self.index.ntotal))
+        return torch.from_numpy(scores), torch.from_numpy(indices)
+    # end_def
+
+    def save(self, store_dir: str):
+        import faiss
+        faiss.write_index(self.index, os.path.join(store_dir, INDEX_FILE))
+    # end_def
+
+    def load(self, store_dir: str, params: dict):
+        import faiss
+        self.params = params
+        self.index = faiss.read_index(os.path.join(store_dir, INDEX_FILE))
+        self._set_search_params()
+        return self
+    # end_def
+
+    def __len__(self):
+        return 0 if self.index is None else self.index.ntotal
+    # end_def
+
+class HNSWIndex(FaissIndex):
+    """
+    Graph-based HNSW index.
+    Params: M (graph degree), ef_construction (build beam), ef_search (query beam; higher = better recall, slower).
+    """
+    kind = "hnsw"
+
+    def __init__(self, M: int = 32, ef_construction: int = 200, ef_search: int = 64):
+        super().__init__(M = M, ef_construction = ef_construction, ef_search = ef_search)
+    # end_def
+
+    def _create(self, dim: int):
+        import faiss
+        index = faiss.IndexHNSWFlat(dim, self.params["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.params["ef_construction"]
+        return index
+    # end_def
+
+    def _set_search_params(self):
+        self.index.hnsw.efSearch = self.params["ef_search"]
+    # end_def
+
+class IVFPQIndex(FaissIndex):
+    """
+    Inverted-file index with product-quantized vectors.
+    Params: nlist (clusters), m (sub-quantizers, must divide the embedding dim), nbits (bits per code), nprobe (clusters visited per query).
+    """
+    kind = "ivfpq"
+
+    def __init__(self, nlist: int = 1024, m: int = 16, nbits: int = 8, nprobe: int = 16):
+        super().__init__(nlist = nlist, m = m, nbits = nbits, nprobe = nprobe)
+    # end_def
+
+    def _create(self, dim: int):
+        import faiss
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, self.params["nlist"], self.params["m"], self.params["nbits"], faiss.METRIC_INNER_PRODUCT)
+    # end_def
+
+    def _set_search_params(self):
+        self.index.nprobe = self.params["nprobe"]
+    # end_def
+
+# Available index backends
+INDEX_BACKENDS = {"flat" : FlatIndex,
+                  "hnsw" : HNSWIndex,
+                  "ivfpq" : IVFPQIndex}
+
+def build_index(embeddings, kind: str = "hnsw", store_dir: str = None, **params):
+    """
+    Builds an index of the given kind over embeddings and, if store_dir is given, saves it next to the embedding store.
+    """
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index kind '{kind}'. Choose from {list(INDEX_BACKENDS)}")
+    index = INDEX_BACKENDS[kind](**params).build(embeddings)
+
+    if store_dir is not None:
+        os.makedirs(store_dir, exist_ok = True)
+        index.save(store_dir)
+        with open(os.path.join(store_dir, INDEX_INFO_FILE), "w") as f:
+            json.dump({"kind" : kind, "params" : index.params, "num_vectors" : len(index)}, f)
+    return index
+
+def load_index(store_dir: str):
+    """
+    Loads the index saved in store_dir by build_index (falls back to an exact flat index if none was built).
+    """
+    info_path = os.path.join(store_dir, INDEX_INFO_FILE)
+    if not os.path.exists(info_path):
+        return FlatIndex().load(store_dir, {})
+    with open(info_path) as f:
+        info = json.load(f)
+    if info["kind"] == "flat":
+        return FlatIndex().load(store_dir, {})
+    index = INDEX_BACKENDS[info["kind"]](**info["params"])
+    return index.load(store_dir, info["params"])
+
+def recall_at_k(index, query_embeddings, embeddings, k: int = 10) -> dict:
+    """
+    Measures recall@k of index against the exact flat search, plus the average query time of both.
+    """
+    exact_index = FlatIndex(embeddings)
+
+    start_time = timer()
+    _, exact_indices = exact_index.search(query_embeddings, k = k)
+    exact_time = timer() - start_time
+
+    start_time = timer()
+    _, approx_indices = index.search(query_embeddings, k = k)
+    approx_time = timer() - start_time
+
+    exact_indices = exact_indices.cpu().numpy()
+    approx_indices = approx_indices.cpu().numpy()
+    hits = sum(len(np.intersect1d(exact_row, approx_row)) for exact_row, approx_row in zip(exact_indices, approx_indices))
+    num_queries = len(exact_indices)
+    return {"recall_at_k" : hits / (num_queries * exact_indices.shape[1]),
+            "k" : k,
+            "exact_ms_per_query" : 1000 * exact_time / num_queries,
+            "index_ms_per_query" : 1000 * approx_time / num_queries}
@@ -1,180 +1,258 @@
 from datasets import load_dataset, Dataset
 import datasets
-import pandas as pd
+import os
+import json
+import string
+import hashlib
+import tempfile
+from time import perf_counter as timer
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Columns of each dataset after conversion: output column -> (source column, list element or None)
+# (MedQA options are a list of {key, value} structs; MMLU choices are a list of strings)
+FORMAT_COLUMNS = {
+    'medqa' : {'question' : ('question', None),
+               'answer_idx' : ('answer_idx', None),
+               'answer' : ('answer', None),
+               'opa' : ('options', 0), 'opb' : ('options', 1), 'opc' : ('options', 2), 'opd' : ('options', 3), 'ope' : ('options', 4)},
+    'medmcqa' : {'question' : ('question', None),
+                 'cop' : ('cop', None),
+                 'opa' : ('opa', None), 'opb' : ('opb', None), 'opc' : ('opc', None), 'opd' : ('opd', None)},
+    'pubmedqa' : {'question' : ('QUESTION', None),
+                  'context' : ('CONTEXTS', None),
+                  'answer' : ('LONG_ANSWER', None),
+                  'answer_idx' : ('final_decision', None)},
+    'mmlu' : {'question' : ('question', None),
+              'subject' : ('subject', None),
+              'answer' : ('answer', None),
+              'opa' : ('choices', 0), 'opb' : ('choices', 1), 'opc' : ('choices', 2), 'opd' : ('choices', 3)},
+    'medquad' : {'question' : ('question', None),
+                 'answer' : ('answer', None)},
+}
+
+def to_arrow_table(data):
+    # pyarrow Table of a Hugging Face Dataset (respecting its indices mapping, e.g. after train_test_split) or a DataFrame
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, Dataset):
+        return data.with_format('arrow')[:]
+    return pa.Table.from_pandas(data, preserve_index = False)
+
+def convert_format_table(data, data_name = 'medqa'):
+    # Arrow table -> Arrow table: every output column is selected (or gathered out of a list column) with pyarrow compute
+    table = to_arrow_table(data)
+    columns = {}
+    for name, (source, element) in FORMAT_COLUMNS[data_name].items():
+        column = table.column(source)
+        if element is not None:
+            column = pc.list_element(column, element)
+            if pa.types.is_struct(column.type):
+                column = pc.struct_field(column, 'value')
+        columns[name] = column
+    return pa.table(columns)
+
+# Option blocks of the multiple-choice prompts
+OPTIONS_4 = 'Options:\n1. {opa}\n2. {opb}\n3. {opc}\n4. {opd}\n'
+OPTIONS_5 = 'Options:\n1. {opa}\n2. {opb}\n3. {opc}\n4. {opd}\n5. {ope}\n'
+
+# Instruction prompt templates (str.format fields are column names; {answer_text} is the text of the correct option)
+PROMPT_TEMPLATES = {
+    'medqa' : ("Question:\n        {question}\n" + OPTIONS_5 +
+               "\n        [INST] Solve this medical question-answering and provide the correct option. [/INST]\n"
+               "        Answer: {answer_text} </s>"),
+    'medmcqa' : ("\n        Question:\n        {question}\n" + OPTIONS_4 +
+                 "\n        [INST] Solve this post graduate medical entrance exam MCQ and provide the correct option. [/INST]\n"
+                 "        Answer: {answer_text} </s>"),
+    'pubmedqa' : ("<s>[INST] <<SYS>> You are an expert in medicine, genetics, and human biology. <</SYS>> "
+                  "Here is my question: {question} Context: {context} Think step by step to answer my question. [/INST] {answer} </s>"),
+    'mmlu' : ("Question:\n        {question}\n" + OPTIONS_4 +
+              "\n        [INST] Solve this medical and biological question-answering and provide the correct option. [/INST]\n"
+              "        Answer: {answer_text} </s>"),
+    'medquad' : "Question: {question}\nAnswer: {answer}",
+}
+
+# Where {answer_text} comes from: (answer index column, index values in option order, option columns)
+ANSWER_OPTIONS = {
+    'medqa' : ('answer_idx', ['A', 'B', 'C', 'D', 'E'], ['opa', 'opb', 'opc', 'opd', 'ope']),
+    'medmcqa' : ('cop', [1, 2, 3, 4], ['opa', 'opb', 'opc', 'opd']),
+    'mmlu' : ('answer', [0, 1, 2, 3], ['opa', 'opb', 'opc', 'opd']),
+}
+
+# List columns are joined into one string (PubMedQA contexts)
+LIST_SEPARATOR = ' Context: '
+
+def _prompt_field(table, name, data_name):
+    # String column for one template field
+    if name == 'answer_text':
+        index_column, index_values, option_columns = ANSWER_OPTIONS[data_name]
+        column = table.column(index_column)
+        # Position of each row's answer among the options (unknown answers pick the trailing 'Nothing')
+        positions = pc.fill_null(pc.index_in(column, value_set = pa.array(index_values, type = column.type)), len(option_columns))
+        options = [table.column(option) for option in option_columns]
+        return pc.choose(positions, *options, pa.scalar('Nothing', type = options[0].type))
+    column = table.column(name)
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        column = pc.binary_join(column, LIST_SEPARATOR)
+    return column
+
+def render_prompts(data, data_name = 'medqa', template = None):
+    # Renders the prompt of every row at once: the template is split into literal pieces and fields, the correct option
+    # is gathered with pc.choose and everything is concatenated column-wise in Arrow (no per-row Python)
+    table = to_arrow_table(data)
+    template = template or PROMPT_TEMPLATES[data_name]
+    # One string type for every piece (pandas 3 frames arrive as large_string, Hugging Face datasets as string)
+    pieces = []
+    for literal, name, _, _ in string.Formatter().parse(template):
+        if literal:
+            pieces.append(pa.scalar(literal, type = pa.large_string()))
+        if name is not None:
+            pieces.append(pc.cast(_prompt_field(table, name, data_name), pa.large_string()))
+    # Missing values print as None, like the f-string templates did
+    return pc.binary_join_element_wise(*pieces, pa.scalar('', type = pa.large_string()), null_handling = 'replace', null_replacement = 'None')
 
 # Defining changing the formats for each datasets
-def convert_format_df(data, data_name = 'medqa'):
-    # MedQA Dataset
-    if data_name == 'medqa':
-        data_extracted = [
-        {'question' : variable['question'], 
-        'answer_idx' : variable['answer_idx'], 
-        'answer' : variable['answer'],
-        'opa' : variable['options'][0]['value'], 
-        'opb' : variable['options'][1]['value'], 
-        'opc' : variable['options'][2]['value'], 
-        'opd' : variable['options'][3]['value'], 
-        'ope' : variable['options'][4]['value']}
-        for variable in data
-        ]
-    # MedMCQA Dataset
-    elif data_name == 'medmcqa':
-        data_extracted = [
-        {'question' : data['question'][i],
-        'cop' : data['cop'][i],
-        'opa' : data['opa'][i],
-        'opb' : data['opb'][i],
-        'opc' : data['opc'][i],
-        'opd' : data['opd'][i],
-        }
-        for i in range(len(data))
-        ]
-    # PubMedQA Dataset
-    elif data_name == 'pubmedqa':
-        data_extracted = [
-        {'question' : data['QUESTION'][i], 
-        'context' : data['CONTEXTS'][i],
-        'answer' : data['LONG_ANSWER'][i],
-        'answer_idx' : data['final_decision'][i]
-        }
-        for i in range(len(data))
-        ]
-    # MMLU Dataset
-    elif data_name == 'mmlu':
-        data_extracted = [
-        {'question' : data['question'][i], 
-        'subject' : data['subject'][i], 
-        'answer' : data['answer'][i],
-        'opa' : data['choices'][i][0], 
-        'opb' : data['choices'][i][1], 
-        'opc' : data['choices'][i][2], 
-        'opd' : data['choices'][i][3]}
-        for i in range(len(data))
-        ]
-    # MedQuAD Dataset
-    elif data_name == 'medquad':
-        data_extracted = [
-        {'question' : data['question'][i], 
-        'answer' : data['answer'][i]}
-        for i in range(len(data))
-        ]
-    df = pd.DataFrame(data_extracted)
-    df['text'] = df.apply(lambda x: generate_prompt(x, data_name = data_name), axis = 1)
-    data_hf = Dataset.from_pandas(df)
+def convert_format_df(data, data_name = 'medqa', template = None):
+    # data: Hugging Face Dataset or pandas DataFrame (set_format('pandas')) of the raw dataset.
+    # Returns (DataFrame, Dataset) with the converted columns and the instruction prompt in 'text'.
+    table = convert_format_table(data, data_name)
+    table = table.append_column('text', render_prompts(table, data_name, template))
+    data_hf = Dataset(table)
+    df = data_hf.to_pandas()
     return df, data_hf
 
 # Defining generating instruction prompts for each datasets
-def generate_prompt(x, data_name = 'medqa'):
-    # MedQA Dataset
-    if data_name == 'medqa':
-        answer_idx = 'Nothing'
-        if x['answer_idx'] == 'A':
-            answer_idx = x['opa']
-        elif x['answer_idx'] == 'B':
-            answer_idx = x['opb']
-        elif x['answer_idx'] == 'C':
-            answer_idx = x['opc']
-        elif x['answer_idx'] == 'D':
-            answer_idx = x['opd']
-        elif x['answer_idx'] == 'E':
-            answer_idx = x['ope']
-        question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n5. {}\n'.format(x['question'], 
-                                                                            x['opa'],
-                                                                            x['opb'], 
-                                                                            x['opc'], 
-                                                                            x['opd'], 
-                                                                            x['ope'])
-        answer = answer_idx
-        prompt = f"""Question:
-        {question}
-        [INST] Solve this medical question-answering and provide the correct option. [/INST]
-        Answer: {answer} </s>""" 
-    
-    # MedMCQA Dataset
-    elif data_name == 'medmcqa':
-        cop = 'Nothing'
-        if x['cop'] == 1:
-            cop = x['opa']
-        elif x['cop'] == 2:
-            cop = x['opb']
-        elif x['cop'] == 3:
-            cop = x['opc']
-        elif x['cop'] == 4:
-            cop = x['opd']
-        question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n'.format(x['question'], x['opa'], x['opb'], x['opc'], x['opd'])
-        answer = cop
-        prompt = f"""
-        Question:
-        {question}
-        [INST] Solve this post graduate medical entrance exam MCQ and provide the correct option. [/INST]
-        Answer: {answer} </s>""" 
-    
-    # PubMedQA Dataset
-    elif data_name == 'pubmedqa':
-        prompt = f"<s>[INST] <<SYS>> You are an expert in medicine, genetics, and human biology. <</SYS>> Here is my question: {x['question']} Context: {' Context: '.join(x['context'])} Think step by step to answer my question. [/INST] {x['answer']} </s>"
-
-    # MMLU Dataset
-    elif data_name == 'mmlu':
-        answer_idx = 'Nothing'
-        if x['answer'] == 0:
-            answer_idx = x['opa']
-        elif x['answer'] == 1:
-            answer_idx = x['opb']
-        elif x['answer'] == 2:
-            answer_idx = x['opc']
-        elif x['answer'] == 3:
-            answer_idx = x['opd']
-        question = '{}\nOptions:\n1. {}\n2. {}\n3. {}\n4. {}\n'.format(x['question'], 
-                                                                    x['opa'],
-                                                                    x['opb'], 
-                                                                    x['opc'], 
-                                                                    x['opd'])
-        answer = answer_idx
-        prompt = f"""Question:
-        {question}
-        [INST] Solve this medical and biological question-answering and provide the correct option. [/INST]
-        Answer: {answer} </s>""" 
-    
-    # MedQuAD Dataset
-    elif data_name == 'medquad':
-        prompt = f"Question: {x['question']}\nAnswer: {x['answer']}"
-        
-    return prompt
+def generate_prompt(x, data_name = 'medqa', template = None):
+    # Prompt of a single converted row (dict or DataFrame row); use render_prompts for whole columns
+    fields = {name : [x[name]] for name in FORMAT_COLUMNS[data_name]}
+    return render_prompts(pa.table(fields), data_name, template)[0].as_py()
+
+def file_fingerprint(path, block_size = 1 << 20):
+    # sha256 of a file's content, read in 1 MB blocks (cache keys of the NER corpora and the persisted FAISS index)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# On-disk cache of converted (and optionally tokenized) splits: one Arrow DatasetDict directory per key
+DATASET_CACHE_DIR = 'Dataset/Cache'
+
+def dataset_cache_key(name, splits, template, tokenizer_name = None, max_length = None):
+    # Directory name of a cached build: (dataset name, splits, prompt template hash, tokenizer name, max_length)
+    template_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()
+    key = json.dumps([name, list(splits), template_hash, tokenizer_name, max_length])
+    return f"{name.replace('/', '_')}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}"
+
+def load_or_build_splits(load_fn, data_name, splits, template = None, tokenizer = None, max_length = None, tokenize_fn = None,
+                         name = None, cache_dir = DATASET_CACHE_DIR):
+    # DatasetDict of the converted splits with the prompt in 'text', memory-mapped from cache_dir after the first build.
+    # load_fn() returns {split : raw data} and is only called on a cache miss, so a warm start never touches load_dataset.
+    # With a tokenizer the text splits are also tokenized (and cached separately), by tokenize_fn (batched map) or by
+    # default the 'text' column truncated to max_length. name is the dataset name in the key (default data_name); pass
+    # a distinct one when load_fn re-splits the raw data. The key does not cover the raw data or tokenize_fn: delete the
+    # directory to rebuild.
+    template = template or PROMPT_TEMPLATES[data_name]
+    tokenizer_name = getattr(tokenizer, 'name_or_path', None) if tokenizer is not None else None
+    path = os.path.join(cache_dir, dataset_cache_key(name or data_name, splits, template, tokenizer_name, max_length))
+    if os.path.isdir(path):
+        return datasets.load_from_disk(path)
+
+    if tokenizer is not None:
+        # Tokenized from the (cached) text splits, so both caches hold the same rows even when load_fn re-splits at random
+        dataset = load_or_build_splits(load_fn, data_name, splits, template, name = name, cache_dir = cache_dir)
+        tokenize_fn = tokenize_fn or (lambda batch: tokenizer(batch['text'], max_length = max_length, truncation = max_length is not None))
+        dataset = dataset.map(tokenize_fn, batched = True)
+    else:
+        raw_splits = load_fn()
+        dataset = datasets.DatasetDict({split : convert_format_df(raw_splits[split], data_name, template)[1] for split in splits})
+    # Written to a temporary directory and renamed, so an interrupted build never leaves a partial cache behind
+    os.makedirs(cache_dir, exist_ok = True)
+    temp_path = tempfile.mkdtemp(dir = cache_dir)
+    dataset.save_to_disk(temp_path)
+    os.replace(temp_path, path)
+    # Reloaded so the returned splits are memory-mapped like on a warm start
+    return datasets.load_from_disk(path)
+
+# Token budget of one test-set batch (prompt tokens + new tokens, summed over the padded batch)
+BATCH_TOKEN_BUDGET = 16 * 512
+
+def token_budget_batches(lengths, max_tokens = BATCH_TOKEN_BUDGET, max_batch_size = None, extra_tokens = 0):
+    # Index batches over prompts sorted by token length, longest first (an out-of-memory batch shows up at once): a batch
+    # grows while batch size * (its longest prompt + extra_tokens) stays within max_tokens, so short prompts share large
+    # batches and long ones get small batches with little padding. A prompt over the budget on its own gets its own batch.
+    order = sorted(range(len(lengths)), key = lambda i: -lengths[i])
+    batches, batch = [], []
+    for i in order:
+        if batch and ((len(batch) + 1) * (lengths[batch[0]] + extra_tokens) > max_tokens or len(batch) == max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def run_in_length_buckets(batch_fn, prompts, tokenizer, max_tokens = BATCH_TOKEN_BUDGET, max_batch_size = None, extra_tokens = 0):
+    # Calls batch_fn(list of prompts) -> list of outputs on token-budget batches of similar-length prompts
+    # (replaces fixed slices of 16 in dataset order) and returns the outputs in the original prompt order
+    lengths = [len(ids) for ids in tokenizer(list(prompts))['input_ids']]
+    outputs = [None] * len(prompts)
+    for batch in tqdm(token_budget_batches(lengths, max_tokens, max_batch_size, extra_tokens)):
+        for i, output in zip(batch, batch_fn([prompts[i] for i in batch])):
+            outputs[i] = output
+    return outputs
+
+# Cache name of the MedQuAD splits built by load_medquad (pass it as load_or_build_splits(name = ...))
+MEDQUAD_CACHE_NAME = 'medquad-resplit'
+
+def load_medquad():
+    # Random 70/10/20 split of MedQuAD without its empty answers; all three splits are built (and cached) together
+    # so they stay disjoint
+    raw_data = load_dataset("lavita/MedQuAD", split = 'train')
+    raw_data = raw_data.filter(lambda answers: [answer is not None and answer != '' for answer in answers],
+                               input_columns = 'answer', batched = True)
+    temp_dataset = raw_data.train_test_split(test_size = 0.2)
+    dataset = temp_dataset['train'].train_test_split(test_size = 0.125)
+    return {'train' : dataset['train'], 'validation' : dataset['test'], 'test' : temp_dataset['test']}
+
+# Medical MMLU subsets (cais/mmlu configs) used for the benchmark evaluation
+MMLU_SUBJECTS = ['clinical_knowledge', 'medical_genetics', 'anatomy', 'professional_medicine', 'college_biology', 'college_medicine']
+
+def _load_mmlu_subject(subject, split = 'test'):
+    # One split of one MMLU config; the subject column is added when the config does not carry it
+    data = load_dataset("cais/mmlu", subject, split = split)
+    if 'subject' not in data.column_names:
+        data = data.add_column('subject', [subject] * len(data))
+    return data
+
+def _resident_memory_mb():
+    # Current resident set size of the process in MB from /proc/self/statm (Linux); None where unavailable.
+    # Unlike ru_maxrss (the lifetime peak), differences of two readings measure what a step added.
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
 
 # Defining getting mmlu datasets
-def get_mmlu_datasets():
-    clinical_knowledge = load_dataset("cais/mmlu", 'clinical_knowledge')
-    medical_genetics = load_dataset("cais/mmlu", 'medical_genetics')
-    anatomy = load_dataset("cais/mmlu", 'anatomy')
-    pro_medicine = load_dataset("cais/mmlu", 'professional_medicine')
-    college_biology = load_dataset("cais/mmlu", 'college_biology')
-    college_medicine = load_dataset("cais/mmlu", 'college_medicine')
+def get_mmlu_datasets(subjects = MMLU_SUBJECTS, split = 'test', max_workers = None):
+    # The subsets are loaded (from the local Hugging Face cache after the first download) in a thread pool, which
+    # overlaps their file reads and Arrow parsing, and concatenated at the Arrow level, with no pandas round-trip.
+    # Returns a datasets.Dataset in subject order with a 'subject' column, not a pandas DataFrame
+    # (call .to_pandas() on it where a DataFrame is needed).
+    start_time = timer()
+    start_memory = _resident_memory_mb()
+    with ThreadPoolExecutor(max_workers = max_workers or len(subjects)) as executor:
+        subsets = list(executor.map(lambda subject: _load_mmlu_subject(subject, split), subjects))
     print("### 1. Loading all MMLU Subsets.....Complete")
 
-    dataset = datasets.DatasetDict({"clinical_knowledge" : clinical_knowledge,
-                                    "medical_genetics" : medical_genetics,
-                                    "anatomy" : anatomy,
-                                    "professional_medicine": pro_medicine,
-                                    "college_biology" : college_biology,
-                                    "college_medicine" : college_medicine
-                                    })
-
-    dataset['clinical_knowledge'].set_format(type = 'pandas')
-    dataset['medical_genetics'].set_format(type = 'pandas')
-    dataset['anatomy'].set_format(type = 'pandas')
-    dataset['professional_medicine'].set_format(type = 'pandas')
-    dataset['college_biology'].set_format(type = 'pandas')
-    dataset['college_medicine'].set_format(type = 'pandas')
-    print("### 2. Changing Data Format to Pandas.....Complete")
-
-    ck = dataset['clinical_knowledge']['test'][:]
-    mg = dataset['medical_genetics']['test'][:]
-    an = dataset['anatomy']['test'][:]
-    pm = dataset['professional_medicine']['test'][:]
-    cb = dataset['college_biology']['test'][:]
-    cm = dataset['college_medicine']['test'][:]
-
-    merged_df = pd.concat([ck, mg, an, pm, cb, cm]).reset_index()
-    del merged_df['index']
-    print("### 3. Concatenating Data into a single DataFrame.....Complete")
-    return merged_df
\ No newline at end of file
+    dataset = datasets.concatenate_datasets(subsets)
+    print("### 2. Concatenating Subsets into a single Dataset.....Complete")
+
+    end_memory = _resident_memory_mb()
+    print(f"[INFO] {len(dataset)} MMLU questions from {len(subjects)} subsets loaded in {timer() - start_time:.3f} seconds"
+          + (f", resident memory {end_memory - start_memory:+.0f} MB" if start_memory is not None and end_memory is not None else ""))
+    return dataset